@@ -1,9 +1,8 @@
-import datetime
 import pandas as pd
 
-
-usuarios = {}
-locais = {}
+import core
+from database import create_tables, definir_operador
+from recalculo import carregar_regras
 
 def menu_principal():
     while True:
@@ -53,58 +52,52 @@ def adicionar_usuario():
     renda = float(input("Renda familiar: "))
     profissao = input("Profissão: ")
 
-    usuario = {
-        "nome": nome,
-        "idade": idade,
-        "endereco": endereco,
-        "pessoas_casa": pessoas_casa,
-        "renda": renda,
-        "profissao": profissao,
-        "apto": verificar_aptidao_usuario(idade, renda),
-        "local_designado": endereco if verificar_aptidao_usuario(idade, renda) else "N/A",
-        "prazo_comparecimento": (datetime.date.today() + datetime.timedelta(days=15)).isoformat() if verificar_aptidao_usuario(idade, renda) else "N/A"
-    }
-
-    usuarios[nome] = usuario
+    try:
+        core.criar_usuario({
+            "nome": nome,
+            "idade": idade,
+            "endereco": endereco,
+            "pessoas_casa": pessoas_casa,
+            "renda": renda,
+            "profissao": profissao,
+        })
+    except ValueError as erro:
+        print(erro)
+        return
     print("Usuário adicionado com sucesso!")
 
 def listar_usuarios():
-    if not usuarios:
-        print("\nNenhum usuário cadastrado.")
-        return
-
-    df = pd.DataFrame(usuarios.values())
-    print("\n--- USUÁRIOS CADASTRADOS ---")
-    print(df.to_string(index=False))
+    listar(core.listar_usuarios, "\nNenhum usuário cadastrado.", "\n--- USUÁRIOS CADASTRADOS ---")
 
 
 def atualizar_usuario():
     nome = input("Digite o nome do usuário a atualizar: ")
-    if nome in usuarios:
-        print("Deixe em branco para manter o valor atual.")
-        idade = input(f"Nova idade (atual: {usuarios[nome]['idade']}): ")
-        if idade: usuarios[nome]['idade'] = int(idade)
-        renda = input(f"Nova renda (atual: {usuarios[nome]['renda']}): ")
-        if renda: usuarios[nome]['renda'] = float(renda)
-
-        
-        usuarios[nome]['apto'] = verificar_aptidao_usuario(usuarios[nome]['idade'], usuarios[nome]['renda'])
-        usuarios[nome]['local_designado'] = usuarios[nome]['endereco'] if usuarios[nome]['apto'] else "N/A"
-        usuarios[nome]['prazo_comparecimento'] = (datetime.date.today() + datetime.timedelta(days=30)).isoformat() if usuarios[nome]['apto'] else "N/A"
-        print("Usuário atualizado.")
-    else:
+    try:
+        usuario = core.obter_usuario(nome)
+    except core.RegistroNaoEncontrado:
         print("Usuário não encontrado.")
+        return
+    print("Deixe em branco para manter o valor atual.")
+    alteracoes = {}
+    idade = input(f"Nova idade (atual: {usuario['idade']}): ")
+    if idade: alteracoes['idade'] = idade
+    renda = input(f"Nova renda (atual: {usuario['renda']}): ")
+    if renda: alteracoes['renda'] = renda
+    try:
+        core.atualizar_usuario(nome, alteracoes)
+    except ValueError as erro:
+        print(erro)
+        return
+    print("Usuário atualizado.")
 
 def remover_usuario():
     nome = input("Digite o nome do usuário a remover: ")
-    if usuarios.pop(nome, None):
+    try:
+        core.remover_usuario(nome)
         print("Usuário removido.")
-    else:
+    except core.RegistroNaoEncontrado:
         print("Usuário não encontrado.")
 
-def verificar_aptidao_usuario(idade, renda):
-    return idade >= 18 and renda <= 2000  
-
 # Menu de locais
 def menu_locais():
     while True:
@@ -136,58 +129,68 @@ def adicionar_local():
     andares = int(input("Quantidade de andares: "))
     area = float(input("Área do local (m²): "))
 
-    capacidade = calcular_capacidade_producao(andares, area)
-    apto = "Sim" if capacidade >= 1000 else "Não"
-
-    local = {
-        "nome_local": nome_local,
-        "endereco": endereco,
-        "responsavel": responsavel,
-        "contato": contato,
-        "andares": andares,
-        "area": area,
-        "capacidade_producao": capacidade,
-        "apto": apto,
-        "mensagem": "O responsável será contatado para mais informações."
-    }
-
-    locais[nome_local] = local
+    try:
+        core.criar_local({
+            "nome_local": nome_local,
+            "endereco": endereco,
+            "responsavel": responsavel,
+            "contato": contato,
+            "andares": andares,
+            "area": area,
+        })
+    except ValueError as erro:
+        print(erro)
+        return
     print("Local adicionado com sucesso!")
 
 def listar_locais():
-    if not locais:
-        print("\nNenhum local cadastrado.")
-        return
-
-    df = pd.DataFrame(locais.values())
-    print("\n--- LOCAIS CADASTRADOS ---")
-    print(df.to_string(index=False))
+    listar(core.listar_locais, "\nNenhum local cadastrado.", "\n--- LOCAIS CADASTRADOS ---")
 
 
 def atualizar_local():
     nome = input("Digite o nome do local a atualizar: ")
-    if nome in locais:
-        print("Deixe em branco para manter o valor atual.")
-        andares = input(f"Novos andares (atual: {locais[nome]['andares']}): ")
-        area = input(f"Nova área (atual: {locais[nome]['area']}): ")
-        if andares: locais[nome]['andares'] = int(andares)
-        if area: locais[nome]['area'] = float(area)
-        capacidade = calcular_capacidade_producao(locais[nome]['andares'], locais[nome]['area'])
-        locais[nome]['capacidade_producao'] = capacidade
-        locais[nome]['apto'] = "Sim" if capacidade >= 1000 else "Não"
-        print("Local atualizado.")
-    else:
+    try:
+        local = core.obter_local(nome)
+    except core.RegistroNaoEncontrado:
         print("Local não encontrado.")
+        return
+    print("Deixe em branco para manter o valor atual.")
+    alteracoes = {}
+    andares = input(f"Novos andares (atual: {local['andares']}): ")
+    area = input(f"Nova área (atual: {local['area']}): ")
+    if andares: alteracoes['andares'] = andares
+    if area: alteracoes['area'] = area
+    try:
+        core.atualizar_local(nome, alteracoes)
+    except ValueError as erro:
+        print(erro)
+        return
+    print("Local atualizado.")
 
 def remover_local():
     nome = input("Digite o nome do local a remover: ")
-    if locais.pop(nome, None):
+    try:
+        core.remover_local(nome)
         print("Local removido.")
-    else:
+    except core.RegistroNaoEncontrado:
         print("Local não encontrado.")
 
-def calcular_capacidade_producao(andares, area):
-    return andares * area * 2  
+# Listagem paginada: mostra uma página por vez em vez da tabela inteira
+def listar(pagina_de, mensagem_vazia, titulo):
+    pagina = pagina_de()
+    if not pagina['itens']:
+        print(mensagem_vazia)
+        return
+    print(titulo)
+    while True:
+        print(pd.DataFrame(pagina['itens']).to_string(index=False))
+        if pagina['proximo'] is None or input("Enter para mais, 'q' para voltar: ").lower() == 'q':
+            break
+        pagina = pagina_de(after=pagina['proximo'])
 
 
-menu_principal()
\ No newline at end of file
+if __name__ == '__main__':
+    create_tables()
+    definir_operador("terminal")
+    carregar_regras()
+    menu_principal()
\ No newline at end of file
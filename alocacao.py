@@ -0,0 +1,360 @@
+"""Capacity-aware assignment of apto applicants to apto vertical-farm sites.
+
+    python alocacao.py [--custo regiao|familia] [--candidatos 64]
+
+Every site offers regras.vagas_local(capacidade_producao) places and every
+applicant takes pessoas_casa of them. Applicants are handled in priority
+order (lowest renda first, larger households first on ties) and each one
+goes to the cheapest site with room, under a pluggable cost.
+
+Costs are computed per *group* of applicants (e.g. per region), not per
+applicant, so the cost matrix is groups x sites however many people there
+are. Arrivals are then spread over days so a site never receives more
+than regras.chegadas_por_dia(andares) people on the same day.
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import database
+from regras import (PRAZO_CADASTRO_DIAS, LOCAL_LISTA_ESPERA, vagas_local_vec,
+                    chegadas_por_dia_vec, verificar_aptidao_usuario)
+
+CANDIDATOS = 64
+
+
+# --- Costs ---
+def regiao(endereco):
+    """Region of an address: its last comma-separated part ("Rua X, Centro" -> "centro")."""
+    # A plain comprehension is several times faster than the .str chain here.
+    return pd.Series([e[e.rfind(',') + 1:].strip().lower() for e in endereco.fillna('')],
+                     index=endereco.index, dtype=object)
+
+
+class CustoRegiao:
+    """0 for a site in the applicant's region, 1 anywhere else."""
+
+    def chave(self, usuarios):
+        return regiao(usuarios['endereco'])
+
+    def matriz(self, grupos, locais):
+        reg_locais = regiao(locais['endereco']).to_numpy()
+        return (grupos['chave'].to_numpy()[:, None] != reg_locais[None, :]).astype(np.float32)
+
+
+class CustoTamanhoFamilia(CustoRegiao):
+    """Region first; among equal regions, bigger households go to bigger sites."""
+
+    peso = 0.5
+
+    def chave(self, usuarios):
+        return regiao(usuarios['endereco']) + '|' + usuarios['pessoas_casa'].astype(str)
+
+    def matriz(self, grupos, locais):
+        base = super().matriz(grupos.assign(chave=grupos['chave'].str.rsplit('|', n=1).str[0]), locais)
+        pessoas = grupos['pessoas_casa'].to_numpy(dtype=np.float32)
+        vagas = vagas_local_vec(locais['capacidade_producao']).astype(np.float32)
+        tamanho_familia = pessoas / max(pessoas.max(initial=1), 1)
+        tamanho_local = vagas / max(vagas.max(initial=1), 1)
+        return base + self.peso * np.abs(tamanho_familia[:, None] - tamanho_local[None, :])
+
+
+CUSTOS = {'regiao': CustoRegiao, 'familia': CustoTamanhoFamilia}
+
+
+def prioridade(usuarios):
+    """Processing order: lowest renda first, then larger households."""
+    return np.lexsort((-usuarios['pessoas_casa'].to_numpy(), usuarios['renda'].to_numpy()))
+
+
+# --- Batch Engine ---
+def alocar(usuarios, locais, custo=None, carga=None, candidatos=CANDIDATOS):
+    """Return, for each row of `usuarios`, the index into `locais` (-1 if none).
+
+    `carga` is the number of places already taken at each site. Pairs of
+    (group, site) are visited from cheapest to most expensive, and each
+    visit hands the site as many of the group's pending applicants, in
+    priority order, as still fit.
+    """
+    custo = custo or CustoRegiao()
+    n = len(usuarios)
+    destino = np.full(n, -1, dtype=np.int64)
+    if n == 0 or len(locais) == 0:
+        return destino
+
+    restante = vagas_local_vec(locais['capacidade_producao'])
+    if carga is not None:
+        restante = restante - np.asarray(carga, dtype=np.int64)
+    demanda = np.maximum(usuarios['pessoas_casa'].to_numpy(dtype=np.int64), 1)
+
+    # Group applicants and lay each group out contiguously in priority order.
+    codigos, chaves = pd.factorize(custo.chave(usuarios), sort=False)
+    rank = np.empty(n, dtype=np.int64)
+    rank[prioridade(usuarios)] = np.arange(n)
+    ordem = np.lexsort((rank, codigos))
+    inicio_grupo = np.searchsorted(codigos[ordem], np.arange(len(chaves)))
+    fim_grupo = np.append(inicio_grupo[1:], n)
+    acumulado = np.concatenate(([0], np.cumsum(demanda[ordem])))
+    demanda_ordem = demanda[ordem].tolist()
+
+    primeiros = ordem[inicio_grupo]
+    grupos = usuarios.iloc[primeiros].reset_index(drop=True).assign(chave=np.asarray(chaves))
+    matriz = np.asarray(custo.matriz(grupos, locais), dtype=np.float64)
+    matriz[:, restante <= 0] = np.inf
+
+    ponteiro = inicio_grupo.copy()
+
+    def percorrer(g_idx, s_idx):
+        for g, s in zip(g_idx.tolist(), s_idx.tolist()):
+            p, fim = ponteiro[g], fim_grupo[g]
+            # The next household in line doesn't fit: skip before searching.
+            if p >= fim or demanda_ordem[p] > restante[s]:
+                continue
+            base = acumulado[p]
+            cabem = np.searchsorted(acumulado[p + 1:fim + 1], base + restante[s], side='right')
+            if cabem == 0:
+                continue
+            destino[ordem[p:p + cabem]] = s
+            restante[s] -= acumulado[p + cabem] - base
+            ponteiro[g] = p + cabem
+
+    # Pass 1: each group's `candidatos` cheapest sites, all groups interleaved by cost.
+    k = min(candidatos, matriz.shape[1])
+    melhores = np.argpartition(matriz, k - 1, axis=1)[:, :k] if k < matriz.shape[1] \
+        else np.tile(np.arange(matriz.shape[1]), (len(matriz), 1))
+    custos = np.take_along_axis(matriz, melhores, axis=1)
+    g_idx = np.repeat(np.arange(len(matriz)), k)
+    validos = np.isfinite(custos.ravel())
+    ordem_pares = np.argsort(custos.ravel()[validos], kind='stable')
+    percorrer(g_idx[validos][ordem_pares], melhores.ravel()[validos][ordem_pares])
+
+    # Pass 2: groups still pending try every site that has room left.
+    pendentes = np.flatnonzero(ponteiro < fim_grupo)
+    abertos = np.flatnonzero(restante > 0)
+    if len(pendentes) and len(abertos):
+        sub = matriz[np.ix_(pendentes, abertos)]
+        g_idx = np.repeat(pendentes, len(abertos))
+        s_idx = np.tile(abertos, len(pendentes))
+        validos = np.isfinite(sub.ravel())
+        ordem_pares = np.argsort(sub.ravel()[validos], kind='stable')
+        percorrer(g_idx[validos][ordem_pares], s_idx[validos][ordem_pares])
+
+    return destino
+
+
+def agendar(destino, usuarios, locais, hoje=None, dias=PRAZO_CADASTRO_DIAS, chegadas=None):
+    """prazo_comparecimento per applicant: the n-th arrival at a site comes on
+    day n // chegadas_por_dia, counted from today + `dias`.
+
+    `chegadas` maps (nome_local, prazo) to arrivals already booked; the
+    newcomers then fill the free slots left on those days first.
+    """
+    prazos = np.full(len(destino), "N/A", dtype=object)
+    alocados = np.flatnonzero(destino >= 0)
+    if len(alocados) == 0:
+        return prazos
+    rank = np.empty(len(usuarios), dtype=np.int64)
+    rank[prioridade(usuarios)] = np.arange(len(usuarios))
+    alocados = alocados[np.lexsort((rank[alocados], destino[alocados]))]
+    sites = destino[alocados]
+    posicao = np.arange(len(sites)) - np.searchsorted(sites, sites)
+    por_dia = chegadas_por_dia_vec(locais['andares'])[sites]
+    primeiro = np.datetime64((hoje or datetime.date.today()) + datetime.timedelta(days=dias), 'D')
+    dia = posicao // por_dia
+    if chegadas:
+        _encaixar(dia, sites, posicao, por_dia, locais, chegadas, primeiro)
+    prazos[alocados] = (primeiro + dia.astype('timedelta64[D]')).astype(str)
+    return prazos
+
+
+def _encaixar(dia, sites, posicao, por_dia, locais, chegadas, primeiro):
+    """Move `dia` past the arrivals already booked, one site at a time: the
+    k-th newcomer takes the k-th free slot from `primeiro` on."""
+    reservas = pd.DataFrame(list(chegadas.items()), columns=['chave', 'total'])
+    reservas['site'] = reservas['chave'].str[0].map(
+        pd.Series(np.arange(len(locais)), index=locais['nome_local']))
+    datas = pd.to_datetime(reservas['chave'].str[1], format='%Y-%m-%d', errors='coerce')
+    reservas['dia'] = (datas - pd.Timestamp(primeiro)).dt.days
+    # Days before `primeiro`, unparseable dates and other sites don't matter.
+    reservas = reservas[reservas['site'].isin(sites) & (reservas['dia'] >= 0) & (reservas['total'] > 0)]
+    for site, grupo in reservas.groupby('site'):
+        a, b = np.searchsorted(sites, [site, site + 1])
+        livres = np.full(int(grupo['dia'].max()) + 1, por_dia[a], dtype=np.int64)
+        np.subtract.at(livres, grupo['dia'].to_numpy(dtype=np.int64), grupo['total'].to_numpy(dtype=np.int64))
+        acumulado = np.cumsum(np.maximum(livres, 0))
+        k = posicao[a:b]
+        dia[a:b] = np.where(k < acumulado[-1], np.searchsorted(acumulado, k, side='right'),
+                            len(livres) + (k - acumulado[-1]) // por_dia[a])
+
+
+# --- Loading ---
+def _carregar_usuarios(db_name, where="apto = 'Sim'", params=()):
+    conn = database.get_connection(db_name)
+    cursor = conn.execute(f"""
+        SELECT nome, endereco, pessoas_casa, renda, local_designado, prazo_comparecimento
+        FROM usuarios WHERE {where}
+    """, params)
+    colunas = ['nome', 'endereco', 'pessoas_casa', 'renda', 'local_designado', 'prazo_comparecimento']
+    return pd.DataFrame(cursor.fetchall(), columns=colunas)
+
+
+def _carregar_locais(db_name):
+    conn = database.get_connection(db_name)
+    cursor = conn.execute("""
+        SELECT nome_local, endereco, andares, capacidade_producao
+        FROM locais WHERE apto = 'Sim' ORDER BY nome_local
+    """)
+    return pd.DataFrame(cursor.fetchall(),
+                        columns=['nome_local', 'endereco', 'andares', 'capacidade_producao'])
+
+
+def _gravar(usuarios, locais, destino, prazos, db_name):
+    nomes_locais = np.append(locais['nome_local'].to_numpy(dtype=object), LOCAL_LISTA_ESPERA)
+    novo_local = nomes_locais[destino]  # -1 picks the waiting list
+    mudou = ((novo_local != usuarios['local_designado'].to_numpy())
+             | (prazos != usuarios['prazo_comparecimento'].to_numpy()))
+    linhas = zip(novo_local[mudou].tolist(), prazos[mudou].tolist(),
+                 usuarios['nome'].to_numpy()[mudou].tolist())
+    database.update_alocacoes_many(linhas, db_name)
+    return int(mudou.sum())
+
+
+# --- Full Run ---
+def alocar_todos(custo=None, candidatos=CANDIDATOS, hoje=None, progresso=None, db_name=None):
+    """Reassign the whole population. `progresso(fracao, mensagem)` is called
+    between stages; if it raises, nothing is written."""
+    progresso = progresso or (lambda fracao, mensagem='': None)
+    inicio = time.perf_counter()
+    # Load, compute and write under one write lock, so rows created meanwhile
+    # wait for us instead of being counted against sites we are filling.
+    with database.unit_of_work(db_name) as conn:
+        progresso(0.0, "Carregando usuários e locais...")
+        usuarios = _carregar_usuarios(db_name)
+        locais = _carregar_locais(db_name)
+        progresso(0.3, "Alocando...")
+        destino = alocar(usuarios, locais, custo, candidatos=candidatos)
+        progresso(0.6, "Agendando comparecimentos...")
+        prazos = agendar(destino, usuarios, locais, hoje)
+        progresso(0.7, "Gravando...")
+        alterados = _gravar(usuarios, locais, destino, prazos, db_name)
+        # Applicants no longer apto lose any previous assignment.
+        conn.execute("""
+            UPDATE usuarios SET local_designado = 'N/A', prazo_comparecimento = 'N/A'
+            WHERE apto != 'Sim' AND (local_designado != 'N/A' OR prazo_comparecimento != 'N/A')
+        """)
+        alterados += conn.execute('SELECT changes()').fetchone()[0]
+        progresso(0.95, "Concluindo...")
+    return {
+        'usuarios': len(usuarios),
+        'locais': len(locais),
+        'alocados': int((destino >= 0).sum()),
+        'lista_espera': int((destino < 0).sum()),
+        'alterados': alterados,
+        'segundos': time.perf_counter() - inicio,
+    }
+
+
+# --- Incremental ---
+def _ocupacao(db_name, excluir, params):
+    """Places taken at each site, from the `ocupacao` summary, minus the rows
+    matched by the `excluir` condition (the ones being reassigned). Also
+    returns those rows' arrivals per (site, day), to subtract in _chegadas."""
+    conn = database.get_connection(db_name)
+    carga = dict(conn.execute('SELECT nome_local, SUM(pessoas) FROM ocupacao GROUP BY nome_local'))
+    retirados = {}
+    for local, prazo, pessoas, total in conn.execute(f"""
+        SELECT local_designado, prazo_comparecimento, SUM(max(coalesce(pessoas_casa, 1), 1)), COUNT(*)
+        FROM usuarios
+        WHERE apto = 'Sim' AND prazo_comparecimento != 'N/A' AND ({excluir})
+        GROUP BY local_designado, prazo_comparecimento
+    """, params):
+        carga[local] = carga.get(local, 0) - pessoas
+        retirados[(local, prazo)] = total
+    return carga, retirados
+
+
+def _chegadas(nomes_locais, retirados, db_name):
+    """Arrivals per (site, day) at the given sites only."""
+    conn = database.get_connection(db_name)
+    chegadas = dict(((local, prazo), total) for local, prazo, total in conn.execute(
+        'SELECT nome_local, prazo, chegadas FROM ocupacao '
+        'WHERE nome_local IN (SELECT value FROM json_each(?)) AND chegadas > 0',
+        (json.dumps(nomes_locais),)))
+    for chave, total in retirados.items():
+        if chave in chegadas:
+            chegadas[chave] -= total
+    return chegadas
+
+
+def _realocar(usuarios, excluir, params, custo, hoje, dias, db_name):
+    """(local_designado, prazo_comparecimento) arrays for `usuarios`, placed
+    around everyone not matched by `excluir`."""
+    locais = _carregar_locais(db_name)
+    carga, retirados = _ocupacao(db_name, excluir, params)
+    carga_locais = locais['nome_local'].map(carga).fillna(0).to_numpy(dtype=np.int64)
+    destino = alocar(usuarios, locais, custo, carga=carga_locais)
+
+    nomes_locais = np.append(locais['nome_local'].to_numpy(dtype=object), LOCAL_LISTA_ESPERA)
+    novo_local = nomes_locais[destino]  # -1 picks the waiting list
+    # Only the sites that receive someone need their booked days.
+    recebem = np.unique(novo_local[destino >= 0]).tolist()
+    chegadas = _chegadas(recebem, retirados, db_name) if recebem else {}
+    return novo_local, agendar(destino, usuarios, locais, hoje, dias, chegadas)
+
+
+def escolher_local(usuario, custo=None, hoje=None, dias=PRAZO_CADASTRO_DIAS, db_name=None):
+    """(local_designado, prazo_comparecimento) for one applicant, given the
+    current occupation of every site. Nothing is written."""
+    if not verificar_aptidao_usuario(usuario['idade'], usuario['renda']):
+        return "N/A", "N/A"
+    df = pd.DataFrame([{col: usuario[col] for col in ('nome', 'endereco', 'pessoas_casa', 'renda')}])
+    novo_local, prazos = _realocar(df, "nome = ?", (usuario['nome'],), custo, hoje, dias, db_name)
+    return novo_local[0], prazos[0]
+
+
+def realocar_locais(nomes_locais, custo=None, hoje=None, dias=PRAZO_CADASTRO_DIAS, db_name=None):
+    """Reassign everyone at the given sites (and the waiting list) after
+    those sites changed or were removed. Returns the number of rows rewritten."""
+    with database.unit_of_work(db_name):
+        nomes = json.dumps(list(dict.fromkeys([*nomes_locais, LOCAL_LISTA_ESPERA])))
+        excluir, params = "local_designado IN (SELECT value FROM json_each(?))", (nomes,)
+        usuarios = _carregar_usuarios(db_name, f"apto = 'Sim' AND {excluir}", params)
+        if usuarios.empty:
+            return 0
+        novo_local, prazos = _realocar(usuarios, excluir, params, custo, hoje, dias, db_name)
+        mudou = ((novo_local != usuarios['local_designado'].to_numpy())
+                 | (prazos != usuarios['prazo_comparecimento'].to_numpy()))
+        database.update_alocacoes_many(zip(novo_local[mudou].tolist(), prazos[mudou].tolist(),
+                                           usuarios['nome'].to_numpy()[mudou].tolist()), db_name)
+    return int(mudou.sum())
+
+
+def realocar_local(nome_local, custo=None, hoje=None, dias=PRAZO_CADASTRO_DIAS, db_name=None):
+    return realocar_locais([nome_local], custo, hoje, dias, db_name)
+
+
+def alocar_lista_espera(custo=None, hoje=None, dias=PRAZO_CADASTRO_DIAS, db_name=None):
+    """Hand places freed elsewhere (a removed or no longer apto user) to
+    the waiting list; nobody already assigned is moved."""
+    return realocar_locais([], custo, hoje, dias, db_name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aloca usuários aptos aos locais aptos.")
+    parser.add_argument('--custo', choices=CUSTOS, default='regiao')
+    parser.add_argument('--candidatos', type=int, default=CANDIDATOS)
+    parser.add_argument('--db', default=database.DB_NAME)
+    args = parser.parse_args(argv)
+    resultado = alocar_todos(CUSTOS[args.custo](), args.candidatos, db_name=args.db)
+    print(' '.join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                   for k, v in resultado.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
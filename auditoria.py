@@ -0,0 +1,323 @@
+"""Snapshots and point-in-time restore on top of the audit log.
+
+    python auditoria.py snapshot [--dir snapshots] [--completo]
+    python auditoria.py historico usuarios "Maria Silva"
+    python auditoria.py restaurar restaurado.db [--ate 2026-10-18T14:30:00 | --mudanca 81234]
+
+Every change to usuarios and locais is appended to the `auditoria` table
+(see database.py). The first snapshot is a compact copy of the database
+taken with the online backup API (the log itself is left out and the copy
+is vacuumed); the following ones are deltas holding only the rows changed
+since the previous snapshot, as they are now, and the keys removed since,
+so their cost follows the activity, not the size of the database.
+--completo starts a new chain with a full copy. Each snapshot is recorded
+in `snapshots` with the id of the last change it contains. Restoring to a
+point copies the full snapshot, applies the deltas up to the newest
+snapshot at or before that point and replays only the logged changes
+after it. Restores always go to a new file; the live database is never
+overwritten.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import database
+
+SNAPSHOT_DIR = 'snapshots'
+# Pages copied per backup step. The source is only locked during a step,
+# so writers keep going while a large snapshot is taken.
+PAGINAS_POR_PASSO = 1024
+LOTE_REPLAY = 10_000
+
+
+# --- Snapshots ---
+# Keys touched by the changes in (?1, ?2]: the key logged with each row, the
+# new key of inserts and updates (a renamed row), and the keys of each bulk
+# statement.
+CHAVES_ALTERADAS_SQL = '''
+    INSERT OR IGNORE INTO temp.chaves (tabela, chave)
+    SELECT tabela, chave FROM auditoria WHERE id > ?1 AND id <= ?2 AND operacao != 'L'
+    UNION ALL
+    SELECT tabela, v0 FROM auditoria WHERE id > ?1 AND id <= ?2 AND operacao IN ('I', 'U')
+    UNION ALL
+    SELECT a.tabela, j.value FROM auditoria a, json_each(a.v2) j
+    WHERE a.id > ?1 AND a.id <= ?2 AND a.operacao = 'L'
+'''
+
+
+def snapshot(diretorio=SNAPSHOT_DIR, completo=False, db_name=None):
+    """Record a snapshot: a delta of the newest one, or a full copy when
+    there is none yet or `completo` is set."""
+    db_name = db_name or database.DB_NAME
+    os.makedirs(diretorio, exist_ok=True)
+    inicio = time.perf_counter()
+    prefixo = os.path.splitext(os.path.basename(db_name))[0]
+    arquivo = os.path.join(diretorio, f"{prefixo}-{datetime.datetime.now():%Y%m%dT%H%M%S%f}.db")
+    parcial = arquivo + '.parcial'
+
+    anterior = None if completo else database.get_connection(db_name).execute(
+        'SELECT id, ultima_mudanca FROM snapshots ORDER BY ultima_mudanca DESC, id DESC LIMIT 1').fetchone()
+    if anterior is None:
+        base, ultima = None, _snapshot_completo(parcial, db_name)
+    else:
+        base, ultima = anterior[0], _snapshot_delta(parcial, anterior[1], db_name)
+    os.replace(parcial, arquivo)
+
+    tamanho = os.path.getsize(arquivo)
+    with database.unit_of_work(db_name) as conn:
+        conn.execute('INSERT INTO snapshots (arquivo, criado_em, ultima_mudanca, bytes, base) VALUES (?, ?, ?, ?, ?)',
+                     (os.path.abspath(arquivo), datetime.datetime.now().isoformat(timespec='seconds'), ultima,
+                      tamanho, base))
+    return {'arquivo': arquivo, 'base': base, 'ultima_mudanca': ultima, 'bytes': tamanho,
+            'segundos': time.perf_counter() - inicio}
+
+
+def _snapshot_completo(parcial, db_name):
+    origem = database.get_connection(db_name)
+    destino = sqlite3.connect(parcial, isolation_level=None)
+    try:
+        # A write from another connection restarts the copy, so what lands
+        # in the file is always one consistent state of the database.
+        origem.backup(destino, pages=PAGINAS_POR_PASSO)
+        ultima = destino.execute('SELECT COALESCE(MAX(id), 0) FROM auditoria').fetchone()[0]
+        # The log and the snapshot list stay in the live database only.
+        destino.execute('DROP TABLE auditoria')
+        destino.execute('DROP TABLE snapshots')
+        destino.execute('PRAGMA journal_mode=DELETE')
+        destino.execute('VACUUM')
+    finally:
+        destino.close()
+    return ultima
+
+
+def _snapshot_delta(parcial, desde, db_name):
+    """Write to `parcial` the current rows of every key changed after change
+    `desde`, and the keys no longer present; returns the last change seen."""
+    # A connection of its own: the delta file is attached to it, and the
+    # read transaction below must not join one open on this thread.
+    origem = sqlite3.connect(db_name, isolation_level=None)
+    try:
+        origem.execute('PRAGMA busy_timeout=5000')
+        origem.execute('ATTACH ? AS delta', (parcial,))
+        for tabela, colunas in database.AUDITED_TABLES.items():
+            origem.execute(f"CREATE TABLE delta.{tabela} ({', '.join(colunas)})")
+        origem.execute('CREATE TABLE delta.removidos (tabela TEXT NOT NULL, chave TEXT NOT NULL)')
+        origem.execute('CREATE TEMP TABLE chaves (tabela TEXT, chave TEXT, PRIMARY KEY (tabela, chave)) WITHOUT ROWID')
+        # One read transaction, so the rows copied are the state as of `ultima`.
+        origem.execute('BEGIN')
+        ultima = origem.execute('SELECT COALESCE(MAX(id), 0) FROM auditoria').fetchone()[0]
+        origem.execute(CHAVES_ALTERADAS_SQL, (desde, ultima))
+        for tabela, colunas in database.AUDITED_TABLES.items():
+            origem.execute(f"""
+                INSERT INTO delta.{tabela} SELECT {', '.join(colunas)} FROM main.{tabela}
+                WHERE {colunas[0]} IN (SELECT chave FROM temp.chaves WHERE tabela = ?)
+            """, (tabela,))
+            origem.execute(f"""
+                INSERT INTO delta.removidos SELECT tabela, chave FROM temp.chaves
+                WHERE tabela = ? AND chave NOT IN (SELECT {colunas[0]} FROM main.{tabela})
+            """, (tabela,))
+        origem.execute('COMMIT')
+    finally:
+        origem.close()
+    return ultima
+
+
+def listar_snapshots(db_name=None):
+    return database.get_connection(db_name).execute(
+        'SELECT id, arquivo, criado_em, ultima_mudanca, bytes, base FROM snapshots ORDER BY id').fetchall()
+
+
+# --- History ---
+def historico(tabela, chave, db_name=None):
+    """[(id, momento, operador, operacao, row dict)] for one record, oldest
+    first. Bulk statements that changed it come as operacao 'L', with the
+    name of the writer instead of the row."""
+    colunas = database.AUDITED_TABLES[tabela]
+    cursor = database.get_connection(db_name).execute(f"""
+        SELECT id, strftime('%Y-%m-%dT%H:%M:%fZ', momento), operador, operacao, chave,
+               {', '.join(database.AUDIT_VALUES[:len(colunas)])}
+        FROM auditoria WHERE tabela = :tabela AND chave = :chave AND operacao != 'L'
+        UNION ALL
+        SELECT id, strftime('%Y-%m-%dT%H:%M:%fZ', momento), operador, operacao, chave,
+               {', '.join(['NULL'] * len(colunas))}
+        FROM auditoria WHERE tabela = :tabela AND operacao = 'L'
+          AND EXISTS (SELECT 1 FROM json_each(v2) WHERE value = :chave)
+        ORDER BY id
+    """, {'tabela': tabela, 'chave': chave})
+    return [(i, m, o, op, {'comando': rotulo} if op == 'L' else dict(zip(colunas, valores)))
+            for i, m, o, op, rotulo, *valores in cursor]
+
+
+# --- Point-in-time Restore ---
+def _momento_utc(momento):
+    """ISO timestamp -> UTC, for julianday() to compare with auditoria.momento.
+    Timestamps without an offset are taken as local time."""
+    dt = datetime.datetime.fromisoformat(momento)
+    dt = (dt if dt.tzinfo else dt.astimezone()).astimezone(datetime.timezone.utc)
+    return f"{dt:%Y-%m-%dT%H:%M:%S}.{dt.microsecond // 1000:03d}Z"
+
+
+def _alvo(conn, ate, mudanca):
+    if mudanca is not None:
+        return mudanca
+    if ate is None:
+        return conn.execute('SELECT COALESCE(MAX(id), 0) FROM auditoria').fetchone()[0]
+    return conn.execute('SELECT COALESCE(MAX(id), 0) FROM auditoria WHERE momento <= julianday(?)',
+                        (_momento_utc(ate),)).fetchone()[0]
+
+
+def _passos(cursor):
+    """Turn log rows into ('upsert'|'delete', tabela, params) and
+    ('lote', tabela, (sql, params)) steps."""
+    for tabela, operacao, chave, *valores in cursor:
+        if operacao == 'L':
+            sql, params, chaves = valores[:3]
+            params = json.loads(params)
+            if isinstance(params, dict):
+                params['chaves'] = chaves
+            yield 'lote', tabela, (sql, params)
+            continue
+        if operacao == 'D':
+            yield 'delete', tabela, (chave,)
+            continue
+        linha = valores[:len(database.AUDITED_TABLES[tabela])]
+        if operacao == 'U' and linha[0] != chave:
+            # Primary key was changed: drop the row under its old key.
+            yield 'delete', tabela, (chave,)
+        yield 'upsert', tabela, tuple(linha)
+
+
+def _upsert_delta(tabela, colunas):
+    return f'''
+        INSERT INTO main.{tabela} ({', '.join(colunas)}) SELECT {', '.join(colunas)} FROM delta.{tabela} WHERE true
+        ON CONFLICT({colunas[0]}) DO UPDATE SET {', '.join(f"{c} = excluded.{c}" for c in colunas[1:])}
+    '''
+
+
+SQL_DELTA = {tabela: _upsert_delta(tabela, colunas) for tabela, colunas in database.AUDITED_TABLES.items()}
+SQL_REPLAY = {
+    ('upsert', 'usuarios'): database.UPSERT_USUARIO_SQL,
+    ('upsert', 'locais'): database.UPSERT_LOCAL_SQL,
+    ('delete', 'usuarios'): database.DELETE_USUARIO_SQL,
+    ('delete', 'locais'): database.DELETE_LOCAL_SQL,
+}
+
+
+def restaurar(destino, ate=None, mudanca=None, db_name=None):
+    """Rebuild the database as of change `mudanca` (or the last change at or
+    before the timestamp `ate`, or the latest change) into the new file
+    `destino`."""
+    if os.path.exists(destino):
+        raise ValueError(f"O destino já existe: {destino}")
+    inicio = time.perf_counter()
+    conn = database.get_connection(db_name)
+    alvo = _alvo(conn, ate, mudanca)
+    snap = conn.execute('''
+        SELECT id, ultima_mudanca FROM snapshots WHERE ultima_mudanca <= ?
+        ORDER BY ultima_mudanca DESC, id DESC LIMIT 1
+    ''', (alvo,)).fetchone()
+    if snap is None:
+        raise ValueError("Nenhum snapshot anterior a esse ponto; crie um com 'auditoria.py snapshot'.")
+    # Walk back through the deltas to the full copy they start from.
+    proximo, base = snap
+    cadeia = []
+    while proximo is not None:
+        arquivo, proximo = conn.execute('SELECT arquivo, base FROM snapshots WHERE id = ?', (proximo,)).fetchone()
+        cadeia.append(arquivo)
+    cadeia.reverse()
+
+    fonte = sqlite3.connect(cadeia[0])
+    restaurado = sqlite3.connect(destino, isolation_level=None)
+    try:
+        fonte.backup(restaurado)
+        # A plain connection: no audit triggers, so the replay is not logged again.
+        restaurado.execute('PRAGMA recursive_triggers=ON')
+        for delta in cadeia[1:]:
+            restaurado.execute('ATTACH ? AS delta', (delta,))
+            restaurado.execute('BEGIN')
+            for tabela, colunas in database.AUDITED_TABLES.items():
+                restaurado.execute(f"""
+                    DELETE FROM main.{tabela}
+                    WHERE {colunas[0]} IN (SELECT chave FROM delta.removidos WHERE tabela = ?)
+                """, (tabela,))
+                restaurado.execute(SQL_DELTA[tabela])
+            restaurado.execute('COMMIT')
+            restaurado.execute('DETACH delta')
+        restaurado.execute('BEGIN')
+        cursor = conn.execute(f'''
+            SELECT tabela, operacao, chave, {', '.join(database.AUDIT_VALUES)} FROM auditoria
+            WHERE id > ? AND id <= ? ORDER BY id
+        ''', (base, alvo))
+        aplicadas = 0
+        # Consecutive steps of the same kind go through one executemany.
+        for (acao, tabela), grupo in itertools.groupby(_passos(cursor), key=lambda p: p[:2]):
+            if acao == 'lote':
+                for _, _, (sql, params) in grupo:
+                    if isinstance(params, list):
+                        restaurado.executemany(sql, params)
+                    else:
+                        restaurado.execute(sql, params)
+                    aplicadas += 1
+                continue
+            for lote in iter(lambda: list(itertools.islice(grupo, LOTE_REPLAY)), []):
+                restaurado.executemany(SQL_REPLAY[(acao, tabela)], (p[2] for p in lote))
+                aplicadas += len(lote)
+        restaurado.execute('COMMIT')
+    finally:
+        fonte.close()
+        restaurado.close()
+    # Fresh, empty log and snapshot list for the restored copy.
+    database.create_tables(destino)
+    return {'snapshot': cadeia[-1], 'deltas': len(cadeia) - 1, 'snapshot_ate': base, 'mudanca': alvo,
+            'aplicadas': aplicadas, 'segundos': time.perf_counter() - inicio}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshots, histórico e restauração a partir da auditoria.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    snp = sub.add_parser('snapshot', help="grava um snapshot (delta do anterior, se houver)")
+    snp.add_argument('--dir', default=SNAPSHOT_DIR)
+    snp.add_argument('--completo', action='store_true', help="cópia completa, início de uma nova cadeia")
+
+    lst = sub.add_parser('snapshots', help="lista os snapshots gravados")
+
+    his = sub.add_parser('historico', help="mudanças de um registro")
+    his.add_argument('tabela', choices=database.AUDITED_TABLES)
+    his.add_argument('chave')
+
+    res = sub.add_parser('restaurar', help="reconstrói o banco em um ponto no tempo")
+    res.add_argument('destino')
+    ponto = res.add_mutually_exclusive_group()
+    ponto.add_argument('--ate', help="momento ISO em hora local, por exemplo 2026-10-18T14:30:00")
+    ponto.add_argument('--mudanca', type=int, help="id da última mudança a incluir")
+
+    for p in (snp, lst, his, res):
+        p.add_argument('--db', default=database.DB_NAME)
+
+    args = parser.parse_args(argv)
+    database.create_tables(args.db)
+    if args.comando == 'snapshot':
+        resultado = snapshot(args.dir, args.completo, args.db)
+    elif args.comando == 'snapshots':
+        for i, arquivo, criado_em, ultima, tamanho, base in listar_snapshots(args.db):
+            tipo = 'completo' if base is None else f'delta de {base}'
+            print(f"{i:4d}  {criado_em}  até mudança {ultima:<10d} {tipo:<14} {tamanho / 2**20:8.1f} MiB  {arquivo}")
+        return 0
+    elif args.comando == 'historico':
+        for i, momento, operador, operacao, linha in historico(args.tabela, args.chave, args.db):
+            print(f"{i:8d}  {momento}  {operador or '-':<12} {operacao}  {linha}")
+        return 0
+    else:
+        resultado = restaurar(args.destino, args.ate, args.mudanca, args.db)
+    print(' '.join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in resultado.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
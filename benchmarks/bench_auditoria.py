@@ -0,0 +1,96 @@
+"""Cost of the audit log, snapshots and point-in-time restore.
+
+Times the same writes on two temporary databases, one with the audit
+triggers and one without, then measures a full snapshot of the audited
+database, a delta snapshot after --delta changes, and a restore that
+applies the delta and replays --delta more changes (against copying the
+whole file).
+
+    python -m benchmarks.bench_auditoria [--linhas 200000] [--unitarias 2000] [--delta 20000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import auditoria
+import database
+from benchmarks.dados import usuarios
+
+
+def _sem_auditoria(db):
+    conn = database.get_connection(db)
+    for (nome,) in conn.execute("SELECT name FROM sqlite_temp_master WHERE type = 'trigger'").fetchall():
+        conn.execute(f'DROP TRIGGER temp.{nome}')
+
+
+def _cronometrar(fn):
+    inicio = time.perf_counter()
+    fn()
+    return time.perf_counter() - inicio
+
+
+def _cenarios(db, args):
+    unitarias = usuarios(args.unitarias, deslocamento=args.linhas)
+    alocacoes = [("Local", "2026-11-01", f"usuario-{i}") for i in range(args.linhas)]
+    return [
+        ("insert em lote", args.linhas, lambda: database.save_users_many(usuarios(args.linhas), db)),
+        ("update em lote", args.linhas, lambda: database.update_alocacoes_many(alocacoes, db)),
+        ("insert unitário", args.unitarias,
+         lambda: [database.save_user_to_db(u, db) for u in unitarias]),
+        ("delete em lote", args.linhas, lambda: database.delete_users_many(
+            (f"usuario-{i}" for i in range(args.linhas)), db)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=200_000)
+    parser.add_argument('--unitarias', type=int, default=2_000)
+    parser.add_argument('--delta', type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sem, com = os.path.join(tmp, 'sem.db'), os.path.join(tmp, 'com.db')
+        for db in (sem, com):
+            database.create_tables(db)
+        _sem_auditoria(sem)
+
+        print(f"{'operação':<18} {'sem auditoria':>16} {'com auditoria':>16} {'custo extra':>12}")
+        for (rotulo, n, fn_sem), (_, _, fn_com) in zip(_cenarios(sem, args), _cenarios(com, args)):
+            t_sem, t_com = _cronometrar(fn_sem), _cronometrar(fn_com)
+            print(f"{rotulo:<18} {t_sem / n * 1e6:13.1f} µs {t_com / n * 1e6:13.1f} µs "
+                  f"{(t_com / t_sem - 1) * 100:10.0f} %")
+
+        # Full snapshot, --delta more changes and a delta snapshot of them,
+        # --delta more again, then restore to the latest change.
+        database.save_users_many(usuarios(args.linhas), com)
+        database.get_connection(com).execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        diretorio = os.path.join(tmp, 'snapshots')
+        resultado = auditoria.snapshot(diretorio, db_name=com)
+        print(f"snapshot completo: {resultado['segundos']:.2f} s, {resultado['bytes'] / 2**20:.1f} MiB "
+              f"(banco com log: {os.path.getsize(com) / 2**20:.1f} MiB)")
+
+        for destino in ("Outro", "Mais um"):
+            database.update_alocacoes_many(
+                [(destino, "2026-12-01", f"usuario-{i}") for i in range(args.delta)], com)
+            if destino == "Outro":
+                resultado = auditoria.snapshot(diretorio, db_name=com)
+                print(f"snapshot delta ({args.delta} mudanças): {resultado['segundos']:.2f} s, "
+                      f"{resultado['bytes'] / 2**20:.1f} MiB")
+        database.get_connection(com).execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        copia = _cronometrar(lambda: shutil.copyfile(com, os.path.join(tmp, 'copia.db')))
+        resultado = auditoria.restaurar(os.path.join(tmp, 'restaurado.db'), db_name=com)
+        print(f"restauração: {resultado['deltas']} delta(s), {resultado['aplicadas']} entradas do log "
+              f"reaplicadas em {resultado['segundos']:.2f} s "
+              f"(cópia do arquivo inteiro: {copia:.2f} s)")
+        for db in (sem, com, os.path.join(tmp, 'restaurado.db')):
+            database.get_connection(db).close()
+        database.close_connections()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Startup time, memory footprint and hit rate of cache.TabelaCache.
+
+Compares the old load-everything dicts (database.load_usuarios) with the
+lazy LRU cache under a skewed access pattern, and checks that a commit
+from another connection is detected through PRAGMA data_version.
+
+    python -m benchmarks.bench_cache [--linhas 200000] [--acessos 200000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import database
+from benchmarks.dados import linhas_usuarios
+from cache import TabelaCache
+
+
+def _medir(fn):
+    # Timed and traced separately: tracemalloc slows allocation down a lot.
+    inicio = time.perf_counter()
+    fn()
+    segundos = time.perf_counter() - inicio
+    tracemalloc.start()
+    resultado = fn()
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return resultado, segundos, memoria
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=200_000)
+    parser.add_argument('--acessos', type=int, default=200_000)
+    parser.add_argument('--capacidade', type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'cache.db')
+        database.create_tables(db)
+        with database.unit_of_work(db) as conn:
+            conn.executemany(database.UPSERT_USUARIO_SQL, linhas_usuarios(args.linhas))
+
+        dados, segundos, memoria = _medir(lambda: database.load_usuarios(db))
+        print(f"load_usuarios (antes):   inicialização {segundos * 1000:9.1f} ms  "
+              f"memória {memoria / 2**20:8.1f} MiB  ({len(dados)} linhas)")
+        del dados
+
+        cache, segundos, _ = _medir(lambda: TabelaCache('usuarios', args.capacidade, db_name=db))
+        print(f"TabelaCache (depois):    inicialização {segundos * 1000:9.1f} ms")
+
+        # Skewed workload: most lookups go to a small set of hot rows.
+        rng = random.Random(42)
+        chaves = [f"usuario-{min(int(rng.paretovariate(1.2)) - 1, args.linhas - 1)}"
+                  if rng.random() < 0.9 else f"usuario-{rng.randrange(args.linhas)}"
+                  for _ in range(args.acessos)]
+        inicio = time.perf_counter()
+        for chave in chaves:
+            cache[chave]
+        segundos = time.perf_counter() - inicio
+        m = cache.metricas()
+        print(f"{args.acessos} acessos em {segundos:.2f} s: hit rate {m['hit_rate']:.1%}, "
+              f"{m['itens']} itens, memória {m['memoria_bytes'] / 2**20:.1f} MiB, "
+              f"{m['evictions']} evictions")
+
+        externa = sqlite3.connect(db)
+        externa.execute("UPDATE usuarios SET renda = 1 WHERE nome = 'usuario-0'")
+        externa.commit()
+        externa.close()
+        renda = cache['usuario-0']['renda']
+        print(f"escrita externa detectada: {renda == 1} (invalidações: {cache.metricas()['invalidacoes']})")
+        database.close_connections()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Query latency with secondary/FTS indexes against a full scan.
+
+For each table size, times the same filters three ways: a Python scan of
+the in-memory dicts (what the app had before), a SQL full scan
+(NOT INDEXED + LIKE) and the indexed query API in consultas.py.
+
+    python -m benchmarks.bench_consultas [--tamanhos 10000 100000 1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import consultas
+import database
+from benchmarks.dados import linhas_usuarios
+
+BAIRROS = 200
+REPETICOES = 5
+
+
+def _locais(n):
+    for i in range(n):
+        andares, area = 1 + i % 20, float(50 + (i * 31) % 400)
+        capacidade = andares * area * 2
+        yield (f"local-{i}", f"Rua {i}, Bairro B{i % BAIRROS}", "resp", "contato", andares, area,
+               capacidade, "Sim" if capacidade >= 1000 else "Não", "")
+
+
+def _medir(fn):
+    melhor = float('inf')
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        resultado = fn()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000, resultado
+
+
+def _linha(rotulo, ms, n):
+    print(f"  {rotulo:<44} {ms:10.2f} ms  ({n} linhas)")
+
+
+def executar(tamanho, tmp):
+    db = os.path.join(tmp, f'consultas_{tamanho}.db')
+    database.create_tables(db)
+    with database.unit_of_work(db) as conn:
+        conn.executemany(database.UPSERT_USUARIO_SQL, linhas_usuarios(tamanho, BAIRROS))
+        conn.executemany(database.UPSERT_LOCAL_SQL, _locais(max(tamanho // 100, 100)))
+    database.optimize(db)
+    usuarios = database.load_usuarios(db)
+    locais = database.load_locais(db)
+
+    print(f"\n{tamanho} usuarios / {len(locais)} locais")
+    # No other bairro starts with B150, so prefix and exact matches agree.
+    bairro = "B150"
+
+    ms, r = _medir(lambda: [u for u in usuarios.values()
+                            if u['apto'] == "Sim" and u['renda'] <= 1500
+                            and u['endereco'].endswith(f"Bairro {bairro}")])
+    _linha("usuarios: varredura do dict em memória", ms, len(r))
+    ms, r = _medir(lambda: conn.execute(
+        "SELECT * FROM usuarios NOT INDEXED WHERE apto = ? AND renda <= ? AND endereco LIKE ?",
+        ("Sim", 1500, f"%Bairro {bairro}")).fetchall())
+    _linha("usuarios: SQL sem índice", ms, len(r))
+    ms, r = _medir(lambda: consultas.buscar_usuarios(apto="Sim", renda_max=1500, texto=bairro,
+                                                     limit=None, db_name=db))
+    _linha("usuarios: consultas.buscar_usuarios", ms, len(r))
+
+    ms, r = _medir(lambda: [l for l in locais.values()
+                            if l['apto'] == "Sim" and l['capacidade_producao'] >= 5000])
+    _linha("locais: varredura do dict em memória", ms, len(r))
+    ms, r = _medir(lambda: conn.execute(
+        "SELECT * FROM locais NOT INDEXED WHERE apto = ? AND capacidade_producao >= ?",
+        ("Sim", 5000)).fetchall())
+    _linha("locais: SQL sem índice", ms, len(r))
+    ms, r = _medir(lambda: consultas.buscar_locais(apto="Sim", capacidade_min=5000, limit=None,
+                                                   db_name=db))
+    _linha("locais: consultas.buscar_locais", ms, len(r))
+
+    ms, r = _medir(lambda: database.fetch_page('usuarios', 'nome', limit=200, db_name=db,
+                                               filtro=consultas.filtro_da_busca('usuarios', f"renda<=1500 apto=sim {bairro}")))
+    _linha("usuarios: primeira página da busca (200)", ms, len(r))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        for tamanho in args.tamanhos:
+            executar(tamanho, tmp)
+        database.close_connections()
+
+
+if __name__ == '__main__':
+    main()
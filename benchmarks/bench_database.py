@@ -0,0 +1,72 @@
+"""Rows/sec for the SQLite write paths.
+
+Compares the original connect-per-row writer with the persistent WAL
+connection (one transaction per row) and the batched writers.
+
+    python -m benchmarks.bench_database [--rows 5000]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import database
+from benchmarks.dados import usuarios
+
+
+def _legacy_save(db_name, user_data):
+    # Same shape as the original save_user_to_db: new connection per row.
+    conn = sqlite3.connect(db_name)
+    conn.execute(database.UPSERT_USUARIO_SQL, database._user_row(user_data))
+    conn.commit()
+    conn.close()
+
+
+def _run(label, fn, rows):
+    start = time.perf_counter()
+    fn(rows)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {len(rows):>8} rows  {elapsed:8.3f} s  {len(rows) / elapsed:12.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    rows = usuarios(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, 'legacy.db')
+        conn = sqlite3.connect(legacy_db)
+        conn.close()
+        database.create_tables(legacy_db)
+        database.close_connections()
+        # The legacy code ran in rollback-journal mode with full syncs.
+        conn = sqlite3.connect(legacy_db)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+        _run('connect per row (antes)', lambda rs: [_legacy_save(legacy_db, r) for r in rs], rows)
+
+        single_db = os.path.join(tmp, 'single.db')
+        database.create_tables(single_db)
+        _run('persistent, 1 tx per row', lambda rs: [database.save_user_to_db(r, single_db) for r in rs], rows)
+
+        batch_db = os.path.join(tmp, 'batch.db')
+        database.create_tables(batch_db)
+        _run('save_users_many (1 tx)', lambda rs: database.save_users_many(rs, batch_db), rows)
+
+        uow_db = os.path.join(tmp, 'uow.db')
+        database.create_tables(uow_db)
+
+        def _uow(rs):
+            with database.unit_of_work(uow_db):
+                for r in rs:
+                    database.save_user_to_db(r, uow_db)
+                database.delete_users_many((r['nome'] for r in rs[::10]), uow_db)
+        _run('unit_of_work upserts+deletes', _uow, rows)
+        database.close_connections()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Re-evaluating every stored row after a rule change.
+
+Seeds a temporary database, raises renda_maxima and compares two ways of
+bringing apto up to date:
+
+  * loading every row and rewriting all of them with executemany, which is
+    what re-saving each record through the existing write path amounts to;
+  * recalculo.recalcular: a chunked UPDATE ... CASE that rewrites only the
+    rows whose result changes.
+
+    python -m benchmarks.bench_recalculo [--usuarios 1000000] [--locais 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import database
+import recalculo
+import regras
+from benchmarks.dados import linhas_usuarios
+from regras import LOCAL_LISTA_ESPERA
+
+
+def _semear(db, usuarios, locais):
+    def linhas_locais():
+        for i in range(locais):
+            andares, area = 1 + i % 10, float(20 + i % 300)
+            capacidade = regras.calcular_capacidade_producao(andares, area)
+            yield (f"local-{i}", f"Av {i}", "resp", "contato", andares, area, capacidade,
+                   "Sim" if regras.verificar_aptidao_local(capacidade) else "Não", regras.MENSAGEM_LOCAL)
+
+    database.create_tables(db)
+    with database.unit_of_work(db) as conn:
+        conn.executemany(database.UPSERT_USUARIO_SQL, linhas_usuarios(usuarios, bairros=200))
+        conn.executemany(database.UPSERT_LOCAL_SQL, linhas_locais())
+
+
+def _reescrever_tudo(db, definicao):
+    """Baseline: recompute in Python and write every row back."""
+    regras.aplicar_definicao(definicao)
+    conn = database.get_connection(db)
+    usuarios = []
+    for row in conn.execute(f"SELECT {', '.join(database.USUARIO_COLUMNS)} FROM usuarios"):
+        usuario = dict(zip(database.USUARIO_COLUMNS, row))
+        apto = regras.verificar_aptidao_usuario(usuario['idade'], usuario['renda'])
+        if (usuario['apto'] == 'Sim') != apto:
+            usuario.update(apto="Sim" if apto else "Não", prazo_comparecimento="N/A",
+                           local_designado=LOCAL_LISTA_ESPERA if apto else "N/A")
+        usuarios.append(usuario)
+    database.save_users_many(usuarios, db)
+    return len(usuarios)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--usuarios', type=int, default=1_000_000)
+    parser.add_argument('--locais', type=int, default=10_000)
+    parser.add_argument('--chunk', type=int, default=recalculo.CHUNK_SIZE)
+    args = parser.parse_args()
+    padrao = regras.definicao_atual()
+    nova = dict(padrao, renda_maxima=2500, capacidade_minima_local=1500)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bancos = [os.path.join(tmp, f'recalculo_{i}.db') for i in range(2)]
+        for db in bancos:
+            _semear(db, args.usuarios, args.locais)
+        print(f"{args.usuarios} usuários, {args.locais} locais; regra: renda_maxima 2000 -> 2500, "
+              f"capacidade_minima_local 1000 -> 1500")
+
+        inicio = time.perf_counter()
+        total = _reescrever_tudo(bancos[0], nova)
+        segundos = time.perf_counter() - inicio
+        print(f"{'reescrever tudo (antes)':<26} {segundos:6.2f} s  {total} linhas gravadas")
+        regras.aplicar_definicao(padrao)
+
+        versao, _ = recalculo.definir(nova, bancos[1])
+        resultado = recalculo.recalcular(versao, args.chunk, db_name=bancos[1])
+        gravadas = sum(v for k, v in resultado.items() if k.startswith(('usuarios_para', 'locais_alterados')))
+        print(f"{'UPDATE ... CASE (depois)':<26} {resultado['segundos']:6.2f} s  {gravadas} linhas gravadas")
+        print('  ' + ' '.join(f"{k}={v}" for k, v in resultado.items() if k != 'segundos'))
+
+        # A second run finds nothing to change.
+        resultado = recalculo.recalcular(versao, args.chunk, db_name=bancos[1])
+        print(f"{'repetido (nada muda)':<26} {resultado['segundos']:6.2f} s  "
+              f"{resultado['usuarios_para_apto'] + resultado['usuarios_para_inapto']} usuários alterados")
+        regras.aplicar_definicao(padrao)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
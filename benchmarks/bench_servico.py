@@ -0,0 +1,195 @@
+"""Local load test for servico.py: p50/p99 latency and requests/sec.
+
+Starts the service on a temporary database in a background thread (or
+targets --url), seeds it through the batch endpoints, then runs
+--clientes concurrent keep-alive clients for --segundos. Each client
+mixes page reads (following the `proximo` cursor), lookups by name,
+searches, creates and updates.
+
+    python -m benchmarks.bench_servico [--clientes 32] [--segundos 10] [--usuarios 20000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit, quote
+
+from benchmarks.dados import entrada_usuario
+from servico import Servico
+
+LOTE = 5_000
+# Share of each operation in the request mix.
+MISTURA = (('pagina', 40), ('obter', 30), ('busca', 10), ('criar', 10), ('atualizar', 10))
+
+
+def _local(i):
+    return {"nome_local": f"local-{i}", "endereco": f"Av {i}, Bairro B{i % 50}", "responsavel": f"resp-{i}",
+            "contato": f"{i:08d}", "andares": 1 + i % 10, "area": float(100 + i % 400)}
+
+
+class Cliente:
+    """Minimal HTTP/1.1 keep-alive client on asyncio streams."""
+
+    def __init__(self, host, porta):
+        self.host, self.porta = host, porta
+        self.reader = self.writer = None
+
+    async def requisitar(self, metodo, caminho, corpo=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.porta)
+        dados = b'' if corpo is None else json.dumps(corpo).encode('utf-8')
+        self.writer.write(f"{metodo} {caminho} HTTP/1.1\r\nHost: {self.host}\r\n"
+                          f"Content-Length: {len(dados)}\r\n\r\n".encode('latin-1') + dados)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        tamanho = 0
+        while True:
+            linha = await self.reader.readline()
+            if linha in (b'\r\n', b''):
+                break
+            nome, _, valor = linha.decode('latin-1').partition(':')
+            if nome.strip().lower() == 'content-length':
+                tamanho = int(valor)
+        resposta = await self.reader.readexactly(tamanho) if tamanho else b''
+        return status, json.loads(resposta) if resposta else None
+
+    def fechar(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _servidor_local(db, pool):
+    """Run Servico on its own event loop thread; returns (host, porta, parar)."""
+    pronto = threading.Event()
+    estado = {}
+
+    def rodar():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        servico = Servico(db, pool)
+        servidor = loop.run_until_complete(servico.iniciar('127.0.0.1', 0))
+        estado['porta'] = servidor.sockets[0].getsockname()[1]
+        estado['loop'] = loop
+        pronto.set()
+        loop.run_forever()
+        servidor.close()
+        loop.run_until_complete(servidor.wait_closed())
+        servico.encerrar()
+        loop.close()
+
+    thread = threading.Thread(target=rodar, daemon=True)
+    thread.start()
+    pronto.wait()
+
+    def parar():
+        estado['loop'].call_soon_threadsafe(estado['loop'].stop)
+        thread.join()
+    return '127.0.0.1', estado['porta'], parar
+
+
+async def _semear(host, porta, usuarios, locais):
+    cliente = Cliente(host, porta)
+    inicio = time.perf_counter()
+    await cliente.requisitar('POST', '/locais/lote', [_local(i) for i in range(locais)])
+    for base in range(0, usuarios, LOTE):
+        status, _ = await cliente.requisitar(
+            'POST', '/usuarios/lote', [entrada_usuario(i) for i in range(base, min(usuarios, base + LOTE))])
+        assert status == 200, status
+    cliente.fechar()
+    print(f"semeado: {usuarios} usuários e {locais} locais via /lote em {time.perf_counter() - inicio:.2f} s")
+
+
+async def _carga(host, porta, clientes, segundos, usuarios):
+    latencias = {op: [] for op, _ in MISTURA}
+    erros = []
+    ops = [op for op, peso in MISTURA for _ in range(peso)]
+    fim = time.perf_counter() + segundos
+    proximo_id = iter(range(usuarios, usuarios + 10_000_000))
+
+    async def trabalhador(semente):
+        rng = random.Random(semente)
+        cliente = Cliente(host, porta)
+        cursor = None
+        while time.perf_counter() < fim:
+            op = rng.choice(ops)
+            if op == 'pagina':
+                caminho = '/usuarios?limit=50&order_by=renda'
+                if cursor:
+                    caminho += '&after=' + quote(json.dumps(cursor))
+                args = ('GET', caminho)
+            elif op == 'obter':
+                args = ('GET', f"/usuarios/usuario-{rng.randrange(usuarios)}")
+            elif op == 'busca':
+                args = ('GET', f"/usuarios?limit=20&busca={quote(f'renda<=1500 b{rng.randrange(50)}')}")
+            elif op == 'criar':
+                args = ('POST', '/usuarios', entrada_usuario(next(proximo_id)))
+            else:
+                args = ('PATCH', f"/usuarios/usuario-{rng.randrange(usuarios)}",
+                        {"renda": float(rng.randrange(4000))})
+            inicio = time.perf_counter()
+            status, resposta = await cliente.requisitar(*args)
+            latencias[op].append((time.perf_counter() - inicio) * 1000)
+            if status >= 400:
+                erros.append((op, status, resposta))
+            elif op == 'pagina':
+                cursor = resposta['proximo']
+        cliente.fechar()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador(i) for i in range(clientes)))
+    return time.perf_counter() - inicio, latencias, erros
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _relatorio(segundos, latencias, erros):
+    todas = [v for vs in latencias.values() for v in vs]
+    print(f"{len(todas)} requisições em {segundos:.2f} s: {len(todas) / segundos:,.0f} req/s, "
+          f"{len(erros)} erros")
+    for op, vs in list(latencias.items()) + [('total', todas)]:
+        if vs:
+            print(f"  {op:<10} n={len(vs):6d}  p50 {statistics.median(vs):7.2f} ms  "
+                  f"p99 {_percentil(vs, 0.99):7.2f} ms")
+    for op, status, resposta in erros[:5]:
+        print(f"  erro {op}: {status} {resposta}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help="serviço já em execução (não semeia o banco)")
+    parser.add_argument('--clientes', type=int, default=32)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--usuarios', type=int, default=20_000)
+    parser.add_argument('--locais', type=int, default=200)
+    parser.add_argument('--pool', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlsplit(args.url)
+        segundos, latencias, erros = asyncio.run(
+            _carga(url.hostname, url.port or 80, args.clientes, args.segundos, args.usuarios))
+        _relatorio(segundos, latencias, erros)
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        host, porta, parar = _servidor_local(os.path.join(tmp, 'servico.db'), args.pool)
+        try:
+            asyncio.run(_semear(host, porta, args.usuarios, args.locais))
+            print(f"carga: {args.clientes} clientes, pool de {args.pool} conexões")
+            _relatorio(*asyncio.run(_carga(host, porta, args.clientes, args.segundos, args.usuarios)))
+        finally:
+            parar()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
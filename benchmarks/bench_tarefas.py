@@ -0,0 +1,130 @@
+"""Headless UI-latency harness for tarefas.ExecutorTarefas.
+
+Stands in for the Tk mainloop with LoopSimulado (a single-threaded after()
+scheduler), schedules a fake UI event every few milliseconds and measures
+how late each one runs while a bulk write is going on:
+
+  * on the loop thread, the way the button callbacks used to do it;
+  * through ExecutorTarefas, with progress and a cancellation check.
+
+    python -m benchmarks.bench_tarefas [--linhas 100000]
+"""
+import argparse
+import heapq
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import database
+from benchmarks.dados import usuarios
+from tarefas import ExecutorTarefas
+
+EVENTO_MS = 5
+
+
+class LoopSimulado:
+    """Minimal stand-in for Tk's event loop: after(), after_idle(), run()."""
+
+    def __init__(self):
+        self._agenda = []
+        self._seq = itertools.count()
+        self.parar = False
+
+    def after(self, ms, fn, *args):
+        heapq.heappush(self._agenda, (time.perf_counter() + ms / 1000, next(self._seq), fn, args))
+
+    def after_idle(self, fn, *args):
+        self.after(0, fn, *args)
+
+    def run(self):
+        while self._agenda and not self.parar:
+            quando, _, fn, args = heapq.heappop(self._agenda)
+            espera = quando - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            fn(*args)
+
+
+def _gravar(tarefa, linhas, db):
+    bloco = 10_000
+    for inicio in range(0, len(linhas), bloco):
+        database.save_users_many(linhas[inicio:inicio + bloco], db)
+        if tarefa is not None:
+            tarefa.reportar(min(1.0, (inicio + bloco) / len(linhas)))
+    return len(linhas)
+
+
+def _medir(loop, iniciar):
+    """Run the loop with a periodic UI event; iniciar(loop, fim) starts the job."""
+    atrasos = []
+
+    def evento(previsto):
+        atrasos.append((time.perf_counter() - previsto) * 1000)
+        if not loop.parar:
+            loop.after(EVENTO_MS, evento, time.perf_counter() + EVENTO_MS / 1000)
+
+    def fim(*_):
+        # Keep the loop going briefly so events delayed by the job get measured.
+        loop.after(50, setattr, loop, 'parar', True)
+
+    loop.after(EVENTO_MS, evento, time.perf_counter() + EVENTO_MS / 1000)
+    loop.after(20, iniciar, loop, fim)
+    inicio = time.perf_counter()
+    loop.run()
+    return time.perf_counter() - inicio, atrasos
+
+
+def _relatorio(rotulo, segundos, atrasos):
+    atrasos = sorted(atrasos)
+    p99 = atrasos[min(len(atrasos) - 1, int(len(atrasos) * 0.99))]
+    print(f"{rotulo:<28} total {segundos:6.2f} s  eventos {len(atrasos):5d}  "
+          f"atraso p50 {statistics.median(atrasos):7.2f} ms  p99 {p99:8.2f} ms  máx {atrasos[-1]:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=100_000)
+    args = parser.parse_args()
+    linhas = usuarios(args.linhas)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bancos = [os.path.join(tmp, f'tarefas_{i}.db') for i in range(3)]
+        for db in bancos:
+            database.create_tables(db)
+
+        def sincrono(loop, fim):
+            _gravar(None, linhas, bancos[0])
+            fim()
+        _relatorio("no loop (antes)", *_medir(LoopSimulado(), sincrono))
+
+        progresso = []
+        loop = LoopSimulado()
+        executor = ExecutorTarefas(loop, max_workers=2)
+
+        def em_segundo_plano(loop, fim):
+            executor.submeter(_gravar, linhas, bancos[1], com_tarefa=True, ao_concluir=fim,
+                              ao_falhar=fim, ao_progresso=lambda fracao, msg: progresso.append(fracao))
+        _relatorio("ExecutorTarefas (depois)", *_medir(loop, em_segundo_plano))
+        print(f"{len(progresso)} atualizações de progresso entregues no loop")
+        executor.encerrar()
+
+        loop = LoopSimulado()
+        executor = ExecutorTarefas(loop, max_workers=2)
+        resultado = []
+
+        def cancelar(loop, fim):
+            tarefa = executor.submeter(_gravar, linhas, bancos[2], com_tarefa=True,
+                                       ao_concluir=resultado.append)
+            loop.after(50, tarefa.cancelar)
+            loop.after(2000, fim)
+        _medir(loop, cancelar)
+        print(f"cancelamento: tarefa {'interrompida' if not resultado else 'não interrompida'}")
+        executor.encerrar()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
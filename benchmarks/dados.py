@@ -0,0 +1,41 @@
+"""Synthetic usuarios shared by the benchmarks.
+
+Row i is always the same person: ages 14-83 and incomes 0-3999 spread so
+that roughly half are apto under the default rules, with apto and
+local_designado derived by the rules in force, as a save would.
+"""
+import database
+import regras
+from regras import LOCAL_LISTA_ESPERA
+
+# Fields a client sends; the rest is derived on save.
+ENTRADA = ('nome', 'idade', 'endereco', 'pessoas_casa', 'renda', 'profissao')
+
+
+def usuario(i, bairros=50):
+    idade, renda = 14 + i % 70, float((i * 7919) % 4000)
+    apto = regras.verificar_aptidao_usuario(idade, renda)
+    return {
+        "nome": f"usuario-{i}", "idade": idade, "endereco": f"Rua {i % 997}, Bairro B{i % bairros}",
+        "pessoas_casa": 1 + i % 6, "renda": renda, "profissao": "agricultor" if i % 3 else "professor",
+        "apto": "Sim" if apto else "Não", "local_designado": LOCAL_LISTA_ESPERA if apto else "N/A",
+        "prazo_comparecimento": "N/A",
+    }
+
+
+def usuarios(n, deslocamento=0, bairros=50):
+    """Rows deslocamento .. deslocamento + n - 1 as dicts."""
+    return [usuario(i, bairros) for i in range(deslocamento, deslocamento + n)]
+
+
+def linhas_usuarios(n, bairros=50):
+    """The same rows as tuples in USUARIO_COLUMNS order, for executemany."""
+    for i in range(n):
+        u = usuario(i, bairros)
+        yield tuple(u[c] for c in database.USUARIO_COLUMNS)
+
+
+def entrada_usuario(i, bairros=50):
+    """Row i as a client would post it, without the derived fields."""
+    u = usuario(i, bairros)
+    return {c: u[c] for c in ENTRADA}
@@ -0,0 +1,193 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import database
+
+CAPACIDADE_PADRAO = 10_000
+
+
+# --- Compact Records ---
+class Registro:
+    """Row stored in __slots__ instead of a per-row dict.
+
+    Supports record['campo'] access so code written against the old dicts
+    (and database._user_row/_local_row) keeps working.
+    """
+    __slots__ = ()
+
+    def __init__(self, *valores, **campos):
+        for col, valor in zip(self.__slots__, valores):
+            setattr(self, col, valor)
+        for col in self.__slots__[len(valores):]:
+            setattr(self, col, campos.get(col))
+
+    @classmethod
+    def de_dict(cls, dados):
+        return cls(*(dados[col] for col in cls.__slots__))
+
+    def __getitem__(self, campo):
+        try:
+            return getattr(self, campo)
+        except AttributeError:
+            raise KeyError(campo) from None
+
+    def __setitem__(self, campo, valor):
+        if campo not in self.__slots__:
+            raise KeyError(campo)
+        setattr(self, campo, valor)
+
+    def keys(self):
+        return self.__slots__
+
+    def as_tuple(self):
+        return tuple(getattr(self, col) for col in self.__slots__)
+
+    def as_dict(self):
+        return dict(zip(self.__slots__, self.as_tuple()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}{self.as_tuple()!r}"
+
+    def tamanho(self):
+        return sys.getsizeof(self) + sum(sys.getsizeof(v) for v in self.as_tuple())
+
+
+class Usuario(Registro):
+    __slots__ = database.USUARIO_COLUMNS
+
+
+class Local(Registro):
+    __slots__ = database.LOCAL_COLUMNS
+
+
+# --- Write-through LRU Cache ---
+class TabelaCache:
+    """Lazily loaded, bounded view of one table with dict-like access.
+
+    Rows are fetched on first access and the `capacidade` most recently
+    used ones are kept. Writes go to SQLite first and then to the cache.
+    Before each access `PRAGMA data_version` is compared with the last
+    value seen; if another connection committed in between, the cache is
+    dropped so it never serves rows that changed on disk.
+    """
+
+    def __init__(self, tabela, capacidade=CAPACIDADE_PADRAO, db_name=None):
+        inicio = time.perf_counter()
+        self.tabela = tabela
+        self.capacidade = capacidade
+        self.db_name = db_name
+        self.registro = Usuario if tabela == 'usuarios' else Local
+        self.chave = database.TABLE_COLUMNS[tabela][0]
+        self._itens = OrderedDict()
+        self._lock = threading.RLock()
+        self._versoes = threading.local()
+        self._select = (f"SELECT {', '.join(self.registro.__slots__)} FROM {tabela} "
+                        f"WHERE {self.chave} = ?")
+        self._save = database.save_user_to_db if tabela == 'usuarios' else database.save_local_to_db
+        self._delete = (database.delete_user_from_db if tabela == 'usuarios'
+                        else database.delete_local_from_db)
+        self.hits = self.misses = self.evictions = self.invalidacoes = 0
+        self._verificar_externo()
+        self.inicializacao_s = time.perf_counter() - inicio
+
+    # --- Consistency ---
+    def _verificar_externo(self):
+        # data_version is per connection, and every thread has its own.
+        versao = database.get_connection(self.db_name).execute('PRAGMA data_version').fetchone()[0]
+        anterior = getattr(self._versoes, 'valor', None)
+        self._versoes.valor = versao
+        # On a thread's first access there is no baseline to compare with:
+        # rows cached through other threads may already be stale.
+        if anterior != versao:
+            self.invalidar()
+
+    def invalidar(self):
+        with self._lock:
+            if self._itens:
+                self.invalidacoes += 1
+            self._itens.clear()
+
+    # --- LRU Bookkeeping ---
+    def _guardar(self, chave, registro):
+        self._itens[chave] = registro
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.capacidade:
+            self._itens.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, chave, default=None):
+        with self._lock:
+            self._verificar_externo()
+            registro = self._itens.get(chave)
+            if registro is not None:
+                self.hits += 1
+                self._itens.move_to_end(chave)
+                return registro
+            self.misses += 1
+            row = database.get_connection(self.db_name).execute(self._select, (chave,)).fetchone()
+            if row is None:
+                return default
+            registro = self.registro(*row)
+            self._guardar(chave, registro)
+            return registro
+
+    def __getitem__(self, chave):
+        registro = self.get(chave)
+        if registro is None:
+            raise KeyError(chave)
+        return registro
+
+    def __contains__(self, chave):
+        return self.get(chave) is not None
+
+    def __setitem__(self, chave, dados):
+        registro = dados if isinstance(dados, self.registro) else self.registro.de_dict(dados)
+        with self._lock:
+            self._verificar_externo()
+            # The caller may have mutated the cached object already.
+            self._itens.pop(chave, None)
+            self._save(registro, self.db_name)
+            self._verificar_externo()
+            # Inside a caller's unit_of_work the row is not committed yet and
+            # may still be rolled back; leave it to be read after the commit.
+            if not database.get_connection(self.db_name).in_transaction:
+                self._guardar(chave, registro)
+
+    def pop(self, chave, default=None):
+        with self._lock:
+            registro = self._itens.pop(chave, None)
+            self._delete(chave, self.db_name)
+            self._verificar_externo()
+            return registro if registro is not None else default
+
+    def __delitem__(self, chave):
+        self.pop(chave)
+
+    def __bool__(self):
+        conn = database.get_connection(self.db_name)
+        return conn.execute(f"SELECT 1 FROM {self.tabela} LIMIT 1").fetchone() is not None
+
+    def __len__(self):
+        conn = database.get_connection(self.db_name)
+        return conn.execute(f"SELECT COUNT(*) FROM {self.tabela}").fetchone()[0]
+
+    # --- Metrics ---
+    def metricas(self):
+        with self._lock:
+            acessos = self.hits + self.misses
+            memoria = sys.getsizeof(self._itens) + sum(
+                sys.getsizeof(k) + r.tamanho() for k, r in self._itens.items())
+            return {
+                'tabela': self.tabela,
+                'itens': len(self._itens),
+                'capacidade': self.capacidade,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / acessos if acessos else 0.0,
+                'evictions': self.evictions,
+                'invalidacoes': self.invalidacoes,
+                'memoria_bytes': memoria,
+                'inicializacao_s': self.inicializacao_s,
+            }
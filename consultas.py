@@ -0,0 +1,117 @@
+import re
+
+import database
+
+# --- Filters ---
+# Each filtro_* function returns a (where_sql, params) pair that can be
+# passed to database.fetch_page or used directly by the buscar_* helpers.
+# Range filters are shaped to hit idx_usuarios_apto_renda_idade and
+# idx_locais_apto_capacidade; free text goes through the FTS5 tables.
+
+def _texto_fts(texto):
+    # Quote every term so user input can't inject FTS5 syntax, and match by
+    # prefix so "cent" finds "Centro".
+    termos = re.findall(r'\w+', texto or '')
+    return ' '.join(f'"{t}"*' for t in termos)
+
+
+def _montar(condicoes, params, tabela, texto):
+    consulta = _texto_fts(texto)
+    if consulta:
+        condicoes.append(f'rowid IN (SELECT rowid FROM {tabela}_fts WHERE {tabela}_fts MATCH ?)')
+        params.append(consulta)
+    return ' AND '.join(condicoes), params
+
+
+def filtro_usuarios(apto=None, renda_min=None, renda_max=None, idade_min=None, idade_max=None,
+                    texto=None):
+    condicoes, params = [], []
+    for sql, valor in (('apto = ?', apto),
+                       ('renda >= ?', renda_min), ('renda <= ?', renda_max),
+                       ('idade >= ?', idade_min), ('idade <= ?', idade_max)):
+        if valor is not None:
+            condicoes.append(sql)
+            params.append(valor)
+    return _montar(condicoes, params, 'usuarios', texto)
+
+
+def filtro_locais(apto=None, capacidade_min=None, capacidade_max=None, texto=None):
+    condicoes, params = [], []
+    for sql, valor in (('apto = ?', apto),
+                       ('capacidade_producao >= ?', capacidade_min),
+                       ('capacidade_producao <= ?', capacidade_max)):
+        if valor is not None:
+            condicoes.append(sql)
+            params.append(valor)
+    return _montar(condicoes, params, 'locais', texto)
+
+
+# --- Queries ---
+def _buscar(tabela, filtro, limit, db_name):
+    colunas = database.TABLE_COLUMNS[tabela]
+    where, params = filtro
+    sql = f"SELECT {', '.join(colunas)} FROM {tabela}"
+    if where:
+        sql += f" WHERE {where}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params = params + [limit]
+    cursor = database.get_connection(db_name).execute(sql, params)
+    return [dict(zip(colunas, row)) for row in cursor]
+
+
+def buscar_usuarios(limit=100, db_name=None, **criterios):
+    return _buscar('usuarios', filtro_usuarios(**criterios), limit, db_name)
+
+
+def buscar_locais(limit=100, db_name=None, **criterios):
+    return _buscar('locais', filtro_locais(**criterios), limit, db_name)
+
+
+def contar(tabela, filtro, db_name=None):
+    where, params = filtro
+    sql = f"SELECT COUNT(*) FROM {tabela}" + (f" WHERE {where}" if where else '')
+    return database.get_connection(db_name).execute(sql, params).fetchone()[0]
+
+
+# --- Search Box Syntax ---
+# "renda<=1500 apto=sim centro" -> renda_max=1500, apto='Sim', texto='centro'
+CAMPOS_NUMERICOS = {
+    'usuarios': {'renda': 'renda', 'idade': 'idade'},
+    'locais': {'capacidade': 'capacidade', 'capacidade_producao': 'capacidade'},
+}
+_TERMO = re.compile(r'^(\w+)(<=|>=|=)(.+)$')
+
+
+def interpretar_busca(tabela, texto):
+    """Turn search-box text into keyword arguments for filtro_<tabela>."""
+    criterios, livres = {}, []
+    campos = CAMPOS_NUMERICOS[tabela]
+    for termo in (texto or '').split():
+        m = _TERMO.match(termo)
+        campo = m and m.group(1).lower()
+        if m and campo == 'apto':
+            criterios['apto'] = 'Sim' if m.group(3).lower() in ('sim', 's', '1', 'true') else 'Não'
+        elif m and campo in campos:
+            try:
+                valor = float(m.group(3).replace(',', '.'))
+            except ValueError:
+                livres.append(termo)
+                continue
+            base = campos[campo]
+            if m.group(2) in ('>=', '='):
+                criterios[f'{base}_min'] = valor
+            if m.group(2) in ('<=', '='):
+                criterios[f'{base}_max'] = valor
+        else:
+            livres.append(termo)
+    if livres:
+        criterios['texto'] = ' '.join(livres)
+    return criterios
+
+
+def filtro_da_busca(tabela, texto):
+    criterios = interpretar_busca(tabela, texto)
+    if tabela == 'usuarios':
+        return filtro_usuarios(**criterios)
+    return filtro_locais(**criterios)
@@ -0,0 +1,284 @@
+"""CRUD operations on usuarios and locais with the aptitude, capacity and
+allocation rules applied. Shared by the terminal front end, the Tk app
+and the HTTP service (servico.py); nothing here does I/O beyond SQLite.
+"""
+import math
+
+import database
+from alocacao import escolher_local, realocar_local, realocar_locais, alocar_lista_espera
+from consultas import filtro_da_busca
+from regras import (verificar_aptidao_usuario, calcular_capacidade_producao, verificar_aptidao_local,
+                    PRAZO_CADASTRO_DIAS, PRAZO_ATUALIZACAO_DIAS, MENSAGEM_LOCAL, LOCAL_LISTA_ESPERA)
+
+LIMITE_PAGINA = 200
+LIMITE_PAGINA_MAXIMO = 1000
+
+
+class RegistroNaoEncontrado(LookupError):
+    pass
+
+
+class RegistroDuplicado(ValueError):
+    pass
+
+
+# --- Validation ---
+CAMPOS_USUARIO = {'nome': str, 'idade': int, 'endereco': str, 'pessoas_casa': int,
+                  'renda': float, 'profissao': str}
+CAMPOS_LOCAL = {'nome_local': str, 'endereco': str, 'responsavel': str, 'contato': str,
+                'andares': int, 'area': float}
+
+
+def _valor(valor, tipo):
+    # str(None) would be "None" and int(25.9) would be 25: reject instead.
+    if valor is None or isinstance(valor, bool) or not isinstance(valor, (str, int, float)):
+        raise TypeError
+    if tipo is str:
+        return str(valor).strip()
+    numero = float(valor)
+    if not math.isfinite(numero) or numero < 0 or (tipo is int and not numero.is_integer()):
+        raise ValueError
+    if tipo is int:
+        # From the original value when possible, so large ints keep every digit.
+        try:
+            return int(valor)
+        except ValueError:
+            return int(numero)
+    return numero
+
+
+def _converter(dados, campos, parcial=False):
+    if not isinstance(dados, dict):
+        raise ValueError(f"Esperado um objeto com os campos, recebido: {dados!r}")
+    convertido = {}
+    for campo, tipo in campos.items():
+        if campo not in dados:
+            if parcial:
+                continue
+            raise ValueError(f"Campo obrigatório ausente: {campo}")
+        valor = dados[campo]
+        try:
+            convertido[campo] = _valor(valor, tipo)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"Valor inválido para {campo}: {valor!r}") from None
+    desconhecidos = set(dados) - set(campos)
+    if desconhecidos:
+        raise ValueError(f"Campos desconhecidos: {', '.join(sorted(desconhecidos))}")
+    return convertido
+
+
+def _chaves(nomes):
+    """Distinct names for a batch delete, in order; anything but text is a
+    client error, not a lookup that silently matches nothing."""
+    invalidos = [i for i, nome in enumerate(nomes) if not isinstance(nome, str)]
+    if invalidos:
+        raise ValueError(f"Nomes devem ser texto (posições {', '.join(map(str, invalidos))}).")
+    return list(dict.fromkeys(nomes))
+
+
+def _derivar_usuario(usuario, dias, db_name):
+    usuario['apto'] = "Sim" if verificar_aptidao_usuario(usuario['idade'], usuario['renda']) else "Não"
+    usuario['local_designado'], usuario['prazo_comparecimento'] = escolher_local(
+        usuario, dias=dias, db_name=db_name)
+    return usuario
+
+
+def _derivar_local(local):
+    local['capacidade_producao'] = calcular_capacidade_producao(local['andares'], local['area'])
+    local['apto'] = "Sim" if verificar_aptidao_local(local['capacidade_producao']) else "Não"
+    local.setdefault('mensagem', MENSAGEM_LOCAL)
+    return local
+
+
+def _obter(tabela, chave, db_name):
+    colunas = database.TABLE_COLUMNS[tabela]
+    row = database.get_connection(db_name).execute(
+        f"SELECT {', '.join(colunas)} FROM {tabela} WHERE {colunas[0]} = ?", (chave,)).fetchone()
+    return dict(zip(colunas, row)) if row else None
+
+
+# --- Usuarios ---
+def obter_usuario(nome, db_name=None):
+    usuario = _obter('usuarios', nome, db_name)
+    if usuario is None:
+        raise RegistroNaoEncontrado(nome)
+    return usuario
+
+
+def criar_usuario(dados, db_name=None):
+    usuario = _converter(dados, CAMPOS_USUARIO)
+    if not usuario['nome']:
+        raise ValueError("O nome não pode ser vazio.")
+    # One transaction, so the allocated slot can't be taken in between.
+    with database.unit_of_work(db_name):
+        if _obter('usuarios', usuario['nome'], db_name) is not None:
+            raise RegistroDuplicado("Já existe um usuário com este nome.")
+        _derivar_usuario(usuario, PRAZO_CADASTRO_DIAS, db_name)
+        database.save_user_to_db(usuario, db_name)
+    return usuario
+
+
+def _tinha_vaga(usuario):
+    """Whether the user held places at a site; freeing them lets the
+    waiting list move up."""
+    return usuario['apto'] == "Sim" and usuario['prazo_comparecimento'] not in (None, "N/A")
+
+
+def atualizar_usuario(nome, alteracoes, db_name=None):
+    alteracoes = _converter(alteracoes, CAMPOS_USUARIO, parcial=True)
+    if alteracoes.get('nome', nome) != nome:
+        raise ValueError("O nome não pode ser alterado.")
+    with database.unit_of_work(db_name):
+        antes = obter_usuario(nome, db_name)
+        usuario = dict(antes, **alteracoes)
+        _derivar_usuario(usuario, PRAZO_ATUALIZACAO_DIAS, db_name)
+        database.save_user_to_db(usuario, db_name)
+        if _tinha_vaga(antes) and (usuario['local_designado'] != antes['local_designado']
+                                   or usuario['pessoas_casa'] < antes['pessoas_casa']):
+            alocar_lista_espera(db_name=db_name)
+    return usuario
+
+
+def remover_usuario(nome, db_name=None):
+    with database.unit_of_work(db_name):
+        usuario = obter_usuario(nome, db_name)
+        database.delete_user_from_db(nome, db_name)
+        if _tinha_vaga(usuario):
+            alocar_lista_espera(db_name=db_name)
+
+
+def criar_usuarios_lote(lista, db_name=None):
+    """Create many users in one transaction. Invalid or duplicated entries
+    are reported per position and skipped; the rest are saved and then
+    allocated together."""
+    resultados, validos = [], {}
+    with database.unit_of_work(db_name):
+        for i, dados in enumerate(lista):
+            try:
+                usuario = _converter(dados, CAMPOS_USUARIO)
+                if not usuario['nome']:
+                    raise ValueError("O nome não pode ser vazio.")
+                if usuario['nome'] in validos or _obter('usuarios', usuario['nome'], db_name):
+                    raise RegistroDuplicado("Já existe um usuário com este nome.")
+            except ValueError as erro:
+                resultados.append({'indice': i, 'ok': False, 'erro': str(erro)})
+                continue
+            apto = verificar_aptidao_usuario(usuario['idade'], usuario['renda'])
+            usuario.update(apto="Sim" if apto else "Não",
+                           local_designado=LOCAL_LISTA_ESPERA if apto else "N/A",
+                           prazo_comparecimento="N/A")
+            validos[usuario['nome']] = usuario
+            resultados.append({'indice': i, 'ok': True, 'nome': usuario['nome']})
+        database.save_users_many(validos.values(), db_name)
+        # New apto users sit on the waiting list; hand them out in one batch.
+        realocar_local(LOCAL_LISTA_ESPERA, db_name=db_name)
+    return resultados
+
+
+def remover_usuarios_lote(nomes, db_name=None):
+    nomes = _chaves(nomes)
+    with database.unit_of_work(db_name):
+        liberam = database.count_assigned_users(nomes, db_name)
+        removidos = database.delete_users_many(nomes, db_name)
+        if liberam:
+            alocar_lista_espera(db_name=db_name)
+    return removidos
+
+
+def listar_usuarios(**kwargs):
+    return _listar('usuarios', **kwargs)
+
+
+# --- Locais ---
+def obter_local(nome_local, db_name=None):
+    local = _obter('locais', nome_local, db_name)
+    if local is None:
+        raise RegistroNaoEncontrado(nome_local)
+    return local
+
+
+def criar_local(dados, db_name=None):
+    local = _derivar_local(_converter(dados, CAMPOS_LOCAL))
+    if not local['nome_local']:
+        raise ValueError("O nome do local não pode ser vazio.")
+    with database.unit_of_work(db_name):
+        if _obter('locais', local['nome_local'], db_name) is not None:
+            raise RegistroDuplicado("Já existe um local com este nome.")
+        database.save_local_to_db(local, db_name)
+        # The waiting list may fit in the new site.
+        realocar_local(local['nome_local'], db_name=db_name)
+    return local
+
+
+def atualizar_local(nome_local, alteracoes, db_name=None):
+    alteracoes = _converter(alteracoes, CAMPOS_LOCAL, parcial=True)
+    if alteracoes.get('nome_local', nome_local) != nome_local:
+        raise ValueError("O nome do local não pode ser alterado.")
+    with database.unit_of_work(db_name):
+        local = obter_local(nome_local, db_name)
+        local.update(alteracoes)
+        _derivar_local(local)
+        database.save_local_to_db(local, db_name)
+        realocar_local(nome_local, db_name=db_name)
+    return local
+
+
+def remover_local(nome_local, db_name=None):
+    with database.unit_of_work(db_name):
+        obter_local(nome_local, db_name)
+        database.delete_local_from_db(nome_local, db_name)
+        realocar_local(nome_local, db_name=db_name)
+
+
+def criar_locais_lote(lista, db_name=None):
+    resultados, validos = [], {}
+    with database.unit_of_work(db_name):
+        for i, dados in enumerate(lista):
+            try:
+                local = _converter(dados, CAMPOS_LOCAL)
+                if not local['nome_local']:
+                    raise ValueError("O nome do local não pode ser vazio.")
+                if local['nome_local'] in validos or _obter('locais', local['nome_local'], db_name):
+                    raise RegistroDuplicado("Já existe um local com este nome.")
+            except ValueError as erro:
+                resultados.append({'indice': i, 'ok': False, 'erro': str(erro)})
+                continue
+            validos[local['nome_local']] = _derivar_local(local)
+            resultados.append({'indice': i, 'ok': True, 'nome_local': local['nome_local']})
+        database.save_locais_many(validos.values(), db_name)
+        if validos:
+            realocar_local(LOCAL_LISTA_ESPERA, db_name=db_name)
+    return resultados
+
+
+def remover_locais_lote(nomes_locais, db_name=None):
+    nomes_locais = _chaves(nomes_locais)
+    with database.unit_of_work(db_name):
+        removidos = database.delete_locais_many(nomes_locais, db_name)
+        # Their users go back through allocation together, in one pass.
+        realocar_locais(nomes_locais, db_name=db_name)
+    return removidos
+
+
+def listar_locais(**kwargs):
+    return _listar('locais', **kwargs)
+
+
+# --- Listing ---
+def _listar(tabela, order_by=None, descending=False, after=None, limit=LIMITE_PAGINA, busca=None,
+            db_name=None):
+    """One keyset page: {'itens': [...], 'proximo': cursor or None}.
+
+    Pass the returned `proximo` back as `after` to get the next page.
+    """
+    limit = max(1, min(int(limit), LIMITE_PAGINA_MAXIMO))
+    colunas = database.TABLE_COLUMNS[tabela]
+    order_by = order_by or colunas[0]
+    filtro = filtro_da_busca(tabela, busca) if busca else None
+    rows = database.fetch_page(tabela, order_by, descending, after, limit, filtro=filtro,
+                               db_name=db_name)
+    proximo = None
+    if len(rows) == limit:
+        ultimo = rows[-1]
+        proximo = [ultimo[colunas.index(order_by)], ultimo[0]]
+    return {'itens': [dict(zip(colunas, row)) for row in rows], 'proximo': proximo}
@@ -0,0 +1,641 @@
+import datetime
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_NAME = 'vertical_farm.db'
+
+USUARIO_COLUMNS = ('nome', 'idade', 'endereco', 'pessoas_casa', 'renda', 'profissao',
+                   'apto', 'local_designado', 'prazo_comparecimento')
+LOCAL_COLUMNS = ('nome_local', 'endereco', 'responsavel', 'contato', 'andares', 'area',
+                 'capacidade_producao', 'apto', 'mensagem')
+
+
+
+def _upsert_sql(tabela, colunas, atribuicoes=None):
+    # ON CONFLICT DO UPDATE rather than INSERT OR REPLACE: an existing row is
+    # updated in place, so it shows up as an update in the audit log instead
+    # of a delete plus an insert, and the FTS index is only touched when a
+    # text column is written. `atribuicoes` overrides the SET expression of
+    # some columns.
+    atribuicoes = atribuicoes or {}
+    return f'''
+        INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})
+        ON CONFLICT({colunas[0]}) DO UPDATE SET {', '.join(f"{c} = {atribuicoes.get(c, f'excluded.{c}')}" for c in colunas[1:])}
+    '''
+
+
+# The SQL text is kept constant so sqlite3's per-connection statement cache
+# reuses the prepared statement on every call.
+UPSERT_USUARIO_SQL = _upsert_sql('usuarios', USUARIO_COLUMNS)
+UPSERT_LOCAL_SQL = _upsert_sql('locais', LOCAL_COLUMNS)
+# Re-importing a user who stays apto keeps the site and date already given
+# instead of sending them back to the waiting list.
+_MANTER_SE_APTO = "CASE WHEN apto = 'Sim' AND excluded.apto = 'Sim' THEN {c} ELSE excluded.{c} END"
+IMPORT_USUARIO_SQL = _upsert_sql('usuarios', USUARIO_COLUMNS, {
+    c: _MANTER_SE_APTO.format(c=c) for c in ('local_designado', 'prazo_comparecimento')})
+UPDATE_ALOCACAO_SQL = 'UPDATE usuarios SET local_designado = ?, prazo_comparecimento = ? WHERE nome = ?'
+DELETE_USUARIO_SQL = 'DELETE FROM usuarios WHERE nome = ?'
+DELETE_LOCAL_SQL = 'DELETE FROM locais WHERE nome_local = ?'
+
+# --- Connection Management ---
+# One long-lived connection per (thread, database file). sqlite3 connections
+# must not be shared across threads, so each thread gets its own.
+_local = threading.local()
+# Recorded with every audited change; the GUI sets the logged-in role.
+_operador = 'sistema'
+
+
+def _configure(conn):
+    conn.execute('PRAGMA journal_mode=WAL')
+    # With WAL, NORMAL only syncs at checkpoints and is still crash safe.
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=5000')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    # INSERT OR REPLACE (still possible from other tools) removes the old row
+    # without firing DELETE triggers unless this is on, which would leave
+    # stale full-text index entries.
+    conn.execute('PRAGMA recursive_triggers=ON')
+    conn.create_function('operador', 0, lambda: _operador)
+
+
+def definir_operador(papel):
+    """Set who is recorded in the audit log for the writes that follow."""
+    global _operador
+    _operador = papel
+
+
+def get_connection(db_name=None):
+    db_name = db_name or DB_NAME
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_name)
+    if conn is None:
+        # isolation_level=None: transactions are opened explicitly with BEGIN.
+        conn = sqlite3.connect(db_name, isolation_level=None, cached_statements=256)
+        _configure(conn)
+        _install_audit(conn)
+        conns[db_name] = conn
+    return conn
+
+
+def close_connections():
+    conns = getattr(_local, 'conns', None) or {}
+    for conn in conns.values():
+        conn.close()
+    conns.clear()
+
+
+@contextmanager
+def unit_of_work(db_name=None):
+    """Group every write made inside the block into a single transaction.
+
+    Nested blocks join the outer transaction, so helpers that open their own
+    unit of work can be called from inside a larger one.
+    """
+    conn = get_connection(db_name)
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+        conn.execute('COMMIT')
+    except BaseException:
+        # Also when COMMIT itself fails (e.g. SQLITE_BUSY): a connection left
+        # inside the transaction would make every later block on this thread
+        # join it and never commit.
+        _rollback(conn)
+        raise
+
+
+def _rollback(conn):
+    # SQLite may already have rolled back on its own; that must not hide the
+    # original error.
+    if conn.in_transaction:
+        try:
+            conn.execute('ROLLBACK')
+        except sqlite3.Error:
+            pass
+
+
+# --- Schema ---
+def create_tables(db_name=None):
+    with unit_of_work(db_name) as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS usuarios (
+                nome TEXT PRIMARY KEY,
+                idade INTEGER,
+                endereco TEXT,
+                pessoas_casa INTEGER,
+                renda REAL,
+                profissao TEXT,
+                apto TEXT,
+                local_designado TEXT,
+                prazo_comparecimento TEXT
+            )
+        ''')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS locais (
+                nome_local TEXT PRIMARY KEY,
+                endereco TEXT,
+                responsavel TEXT,
+                contato TEXT,
+                andares INTEGER,
+                area REAL,
+                capacidade_producao REAL,
+                apto TEXT,
+                mensagem TEXT
+            )
+        ''')
+
+        # One row per business-rule definition; see recalculo.py.
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS regras (
+                versao INTEGER PRIMARY KEY AUTOINCREMENT,
+                definicao TEXT NOT NULL,
+                criada_em TEXT NOT NULL,
+                aplicada_em TEXT
+            )
+        ''')
+
+        _create_audit(conn)
+
+        # Secondary indexes for the filters in consultas.py.
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_apto_renda_idade ON usuarios(apto, renda, idade)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_locais_apto_capacidade ON locais(apto, capacidade_producao)')
+        # Reassigning one site loads only its users.
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_local_apto ON usuarios(local_designado, apto)')
+        _create_ocupacao(conn)
+
+        _create_fts(conn, 'usuarios', ('nome', 'endereco', 'profissao'))
+        _create_fts(conn, 'locais', ('nome_local', 'endereco', 'responsavel'))
+    optimize(db_name)
+
+
+def optimize(db_name=None):
+    """Refresh planner statistics so FTS-driven searches start from the FTS.
+
+    analysis_limit keeps this to a sampled pass, cheap even on large tables.
+    """
+    conn = get_connection(db_name)
+    conn.execute('PRAGMA analysis_limit=1000')
+    # Only the content tables: stats taken on the FTS5 shadow tables while
+    # they are small make FTS5's internal lookups degrade into scans later.
+    conn.execute('ANALYZE usuarios')
+    conn.execute('ANALYZE locais')
+
+
+def _create_fts(conn, tabela, colunas):
+    """External-content FTS5 index over `colunas`, kept in sync by triggers."""
+    fts = f'{tabela}_fts'
+    existe = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,)).fetchone()
+    cols = ', '.join(colunas)
+    new_cols = ', '.join(f'new.{c}' for c in colunas)
+    old_cols = ', '.join(f'old.{c}' for c in colunas)
+    conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{tabela}', content_rowid='rowid')")
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {tabela}_fts_ai AFTER INSERT ON {tabela} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_cols});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {tabela}_fts_ad AFTER DELETE ON {tabela} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+        END
+    ''')
+    # Upserts name every column; only reindex when a text column really changed.
+    # Dropped and recreated so databases with the older, unconditional trigger
+    # pick this one up.
+    mudou = ' OR '.join(f'old.{c} IS NOT new.{c}' for c in colunas)
+    conn.execute(f'DROP TRIGGER IF EXISTS {tabela}_fts_au')
+    conn.execute(f'''
+        CREATE TRIGGER {tabela}_fts_au AFTER UPDATE OF {cols} ON {tabela} WHEN {mudou} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_cols});
+        END
+    ''')
+    if not existe:
+        # Index rows that were already in the table before the FTS existed.
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+# --- Site Occupation ---
+# Places taken and arrivals per (site, day), kept by triggers so allocating
+# one applicant reads this small table instead of grouping all of usuarios.
+# Only apto users with a real assignment count; the waiting list has prazo
+# 'N/A'.
+_OCUPA = ("{r}.apto = 'Sim' AND {r}.local_designado IS NOT NULL "
+          "AND {r}.prazo_comparecimento IS NOT NULL AND {r}.prazo_comparecimento != 'N/A'")
+_PESSOAS = "max(coalesce({r}.pessoas_casa, 1), 1)"
+
+
+def _create_ocupacao(conn):
+    existe = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'ocupacao'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ocupacao (
+            nome_local TEXT NOT NULL,
+            prazo TEXT NOT NULL,
+            pessoas INTEGER NOT NULL,
+            chegadas INTEGER NOT NULL,
+            PRIMARY KEY (nome_local, prazo)
+        ) WITHOUT ROWID
+    ''')
+    # Rows that drop to zero are left in place (readers skip them): one
+    # statement per trigger keeps allocation updates cheap.
+    entra = f'''
+        INSERT INTO ocupacao (nome_local, prazo, pessoas, chegadas)
+        VALUES (new.local_designado, new.prazo_comparecimento, {_PESSOAS.format(r='new')}, 1)
+        ON CONFLICT (nome_local, prazo) DO UPDATE
+        SET pessoas = pessoas + excluded.pessoas, chegadas = chegadas + 1;
+    '''
+    sai = f'''
+        UPDATE ocupacao SET pessoas = pessoas - {_PESSOAS.format(r='old')}, chegadas = chegadas - 1
+        WHERE nome_local = old.local_designado AND prazo = old.prazo_comparecimento;
+    '''
+    colunas = ('apto', 'local_designado', 'prazo_comparecimento', 'pessoas_casa')
+    mudou = ' OR '.join(f'old.{c} IS NOT new.{c}' for c in colunas)
+    gatilhos = {
+        'ai': ('INSERT', _OCUPA.format(r='new'), entra),
+        'ad': ('DELETE', _OCUPA.format(r='old'), sai),
+        'au_sai': (f"UPDATE OF {', '.join(colunas)}", f"({mudou}) AND {_OCUPA.format(r='old')}", sai),
+        'au_entra': (f"UPDATE OF {', '.join(colunas)}", f"({mudou}) AND {_OCUPA.format(r='new')}", entra),
+    }
+    for nome, (evento, quando, corpo) in gatilhos.items():
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS usuarios_ocupacao_{nome} AFTER {evento} ON usuarios
+            WHEN {quando} BEGIN {corpo} END
+        ''')
+    if not existe:
+        # Count the assignments made before the table existed.
+        conn.execute(f'''
+            INSERT INTO ocupacao (nome_local, prazo, pessoas, chegadas)
+            SELECT local_designado, prazo_comparecimento, SUM({_PESSOAS.format(r='usuarios')}), COUNT(*)
+            FROM usuarios WHERE {_OCUPA.format(r='usuarios')}
+            GROUP BY local_designado, prazo_comparecimento
+        ''')
+
+
+# --- Audit Log ---
+# Every insert, update and delete on usuarios and locais is appended to
+# `auditoria` by triggers, so bulk SQL (imports, other tools) is covered as
+# well as the save/delete functions below. v0, v1, ... hold the row after
+# the change (before it, for deletes) in TABLE_COLUMNS order, as plain
+# columns: building JSON per row roughly doubled the cost of logging.
+# `momento` is a UTC julian day, also cheaper per row than a formatted
+# timestamp.
+#
+# The bulk writers (allocation, recompute) log one 'L' row per statement
+# instead, through _registro_por_comando: `chave` names the writer, v0 is the
+# SQL to replay, v1 its parameters as JSON (a list of rows for executemany,
+# or named parameters) and v2 the JSON array of the keys it changed, given
+# to the SQL as :chaves. auditoria.py builds snapshots and restores on top.
+AUDITED_TABLES = {'usuarios': USUARIO_COLUMNS, 'locais': LOCAL_COLUMNS}
+AUDIT_VALUES = tuple(f'v{i}' for i in range(max(map(len, AUDITED_TABLES.values()))))
+
+
+def _create_audit(conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS auditoria (
+            id INTEGER PRIMARY KEY,
+            momento REAL NOT NULL,
+            operador TEXT,
+            tabela TEXT NOT NULL,
+            operacao TEXT NOT NULL,
+            chave TEXT NOT NULL,
+            {', '.join(AUDIT_VALUES)}
+        )
+    ''')
+    for evento in ('UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS auditoria_somente_insercao_{evento.lower()}
+            BEFORE {evento} ON auditoria BEGIN
+                SELECT RAISE(ABORT, 'auditoria é somente de inserção');
+            END
+        ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id INTEGER PRIMARY KEY,
+            arquivo TEXT NOT NULL,
+            criado_em TEXT NOT NULL,
+            ultima_mudanca INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            -- NULL for a full copy; otherwise the snapshot this one is a delta of.
+            base INTEGER REFERENCES snapshots(id)
+        )
+    ''')
+    _install_audit(conn)
+
+
+def _install_audit(conn):
+    """Create this connection's audit triggers.
+
+    They are TEMP triggers: they call operador(), which only exists on
+    connections opened here, so other tools writing to the file keep
+    working (unaudited) instead of failing.
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'auditoria'").fetchone():
+        return
+    for tabela, colunas in AUDITED_TABLES.items():
+        novo = ', '.join(f'new.{c}' for c in colunas)
+        velho = ', '.join(f'old.{c}' for c in colunas)
+        mudou = ' OR '.join(f'old.{c} IS NOT new.{c}' for c in colunas)
+        insert = (f"INSERT INTO auditoria (momento, operador, tabela, operacao, chave, "
+                  f"{', '.join(AUDIT_VALUES[:len(colunas)])})")
+        conn.execute(f'''
+            CREATE TEMP TRIGGER IF NOT EXISTS {tabela}_audit_ai AFTER INSERT ON main.{tabela} BEGIN
+                {insert} VALUES (julianday('now'), operador(), '{tabela}', 'I', new.{colunas[0]}, {novo});
+            END
+        ''')
+        # Upserts that write identical values are not logged.
+        conn.execute(f'''
+            CREATE TEMP TRIGGER IF NOT EXISTS {tabela}_audit_au AFTER UPDATE ON main.{tabela}
+            WHEN {mudou} BEGIN
+                {insert} VALUES (julianday('now'), operador(), '{tabela}', 'U', old.{colunas[0]}, {novo});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TEMP TRIGGER IF NOT EXISTS {tabela}_audit_ad AFTER DELETE ON main.{tabela} BEGIN
+                {insert} VALUES (julianday('now'), operador(), '{tabela}', 'D', old.{colunas[0]}, {velho});
+            END
+        ''')
+
+
+@contextmanager
+def _registro_por_comando(conn, tabela, rotulo, sql, params, chaves):
+    """Run the block with `tabela`'s row-level update trigger off and log it
+    as one 'L' entry: replaying `sql` with `params` (and :chaves, the JSON
+    array of the changed keys) on the state before it has the same effect."""
+    gatilho = f'{tabela}_audit_au'
+    if not conn.execute("SELECT 1 FROM sqlite_temp_master WHERE name = ?", (gatilho,)).fetchone():
+        yield
+        return
+    # TEMP DDL is part of the transaction: a rollback restores the trigger too.
+    conn.execute(f'DROP TRIGGER temp.{gatilho}')
+    try:
+        yield
+    finally:
+        _install_audit(conn)
+    conn.execute("""
+        INSERT INTO auditoria (momento, operador, tabela, operacao, chave, v0, v1, v2)
+        VALUES (julianday('now'), operador(), ?, 'L', ?, ?, ?, ?)
+    """, (tabela, rotulo, sql, json.dumps(params), chaves))
+
+
+# --- Row Helpers ---
+def _user_row(user_data):
+    return tuple(user_data[col] for col in USUARIO_COLUMNS)
+
+
+def _local_row(local_data):
+    return tuple(local_data[col] for col in LOCAL_COLUMNS)
+
+
+# --- Single-row Writes ---
+def save_user_to_db(user_data, db_name=None):
+    with unit_of_work(db_name) as conn:
+        conn.execute(UPSERT_USUARIO_SQL, _user_row(user_data))
+
+
+def delete_user_from_db(nome, db_name=None):
+    with unit_of_work(db_name) as conn:
+        conn.execute(DELETE_USUARIO_SQL, (nome,))
+
+
+def save_local_to_db(local_data, db_name=None):
+    with unit_of_work(db_name) as conn:
+        conn.execute(UPSERT_LOCAL_SQL, _local_row(local_data))
+
+
+def delete_local_from_db(nome_local, db_name=None):
+    with unit_of_work(db_name) as conn:
+        conn.execute(DELETE_LOCAL_SQL, (nome_local,))
+
+
+# --- Batched Writes ---
+def save_users_many(users, db_name=None):
+    with unit_of_work(db_name) as conn:
+        conn.executemany(UPSERT_USUARIO_SQL, (_user_row(u) for u in users))
+
+
+def save_locais_many(locais, db_name=None):
+    with unit_of_work(db_name) as conn:
+        conn.executemany(UPSERT_LOCAL_SQL, (_local_row(l) for l in locais))
+
+
+def delete_users_many(nomes, db_name=None):
+    """Delete by name; returns how many rows actually existed."""
+    with unit_of_work(db_name) as conn:
+        return conn.executemany(DELETE_USUARIO_SQL, ((n,) for n in nomes)).rowcount
+
+
+def count_assigned_users(nomes, db_name=None):
+    """How many of `nomes` hold places at a site (apto, with a date)."""
+    return get_connection(db_name).execute(
+        "SELECT COUNT(*) FROM usuarios WHERE nome IN (SELECT value FROM json_each(?)) "
+        "AND apto = 'Sim' AND prazo_comparecimento != 'N/A'", (json.dumps(list(nomes)),)).fetchone()[0]
+
+
+def delete_locais_many(nomes_locais, db_name=None):
+    with unit_of_work(db_name) as conn:
+        return conn.executemany(DELETE_LOCAL_SQL, ((n,) for n in nomes_locais)).rowcount
+
+
+def update_alocacoes_many(alocacoes, db_name=None):
+    """Write (local_designado, prazo_comparecimento, nome) triples, logged as
+    a single audit entry."""
+    alocacoes = [tuple(a) for a in alocacoes]
+    if not alocacoes:
+        return
+    with unit_of_work(db_name) as conn:
+        with _registro_por_comando(conn, 'usuarios', 'alocacao', UPDATE_ALOCACAO_SQL, alocacoes,
+                                   json.dumps([a[2] for a in alocacoes])):
+            conn.executemany(UPDATE_ALOCACAO_SQL, alocacoes)
+
+
+# --- Reads ---
+def load_usuarios(db_name=None):
+    cursor = get_connection(db_name).execute('SELECT * FROM usuarios')
+    return {row[0]: dict(zip(USUARIO_COLUMNS, row)) for row in cursor}
+
+
+def load_locais(db_name=None):
+    cursor = get_connection(db_name).execute('SELECT * FROM locais')
+    return {row[0]: dict(zip(LOCAL_COLUMNS, row)) for row in cursor}
+
+
+# --- Paginated Reads ---
+TABLE_COLUMNS = {'usuarios': USUARIO_COLUMNS, 'locais': LOCAL_COLUMNS}
+
+
+def fetch_page(tabela, order_by=None, descending=False, after=None, limit=200, filtro=None,
+               db_name=None):
+    """Return up to `limit` rows of `tabela` ordered by (order_by, primary key).
+
+    Keyset pagination: `after` is the (order_by value, primary key) pair of
+    the last row already shown, so each page is an index seek instead of an
+    OFFSET scan over every earlier row. `filtro` is an optional
+    (where_sql, params) pair, as built by consultas.filtro_usuarios/locais.
+    """
+    colunas = TABLE_COLUMNS[tabela]
+    chave = colunas[0]
+    order_by = order_by or chave
+    if order_by not in colunas:
+        raise ValueError(f"Coluna desconhecida: {order_by}")
+
+    direcao, comparacao = ('DESC', '<') if descending else ('ASC', '>')
+    condicoes, params = [], []
+    if filtro and filtro[0]:
+        condicoes.append(f'({filtro[0]})')
+        params.extend(filtro[1])
+    if after is not None:
+        if order_by == chave:
+            condicoes.append(f'{chave} {comparacao} ?')
+            params.append(after[1])
+        elif after[0] is None:
+            # SQLite sorts NULL first: after a NULL, the rest of the NULLs by
+            # key, then (ascending) every non-NULL value.
+            resto = '' if descending else f' OR {order_by} IS NOT NULL'
+            condicoes.append(f'(({order_by} IS NULL AND {chave} {comparacao} ?){resto})')
+            params.append(after[1])
+        else:
+            # A row-value comparison is NULL for NULL columns; descending,
+            # those still come after every value.
+            resto = f' OR {order_by} IS NULL' if descending else ''
+            condicoes.append(f'(({order_by}, {chave}) {comparacao} (?, ?){resto})')
+            params.extend(after)
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+    order = direcao if order_by == chave else f'{direcao}, {chave} {direcao}'
+    sql = f"SELECT {', '.join(colunas)} FROM {tabela} {where} ORDER BY {order_by} {order} LIMIT ?"
+    return get_connection(db_name).execute(sql, params + [limit]).fetchall()
+
+
+# --- Rule Versions ---
+def _agora():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+def save_rules_version(definicao, db_name=None):
+    """Store a new rule definition; returns its version number."""
+    with unit_of_work(db_name) as conn:
+        cursor = conn.execute('INSERT INTO regras (definicao, criada_em) VALUES (?, ?)',
+                              (json.dumps(definicao, sort_keys=True), _agora()))
+        return cursor.lastrowid
+
+
+def mark_rules_applied(versao, db_name=None):
+    with unit_of_work(db_name) as conn:
+        conn.execute('UPDATE regras SET aplicada_em = ? WHERE versao = ?', (_agora(), versao))
+
+
+def load_rules_versions(db_name=None):
+    """[(versao, definicao, criada_em, aplicada_em)], oldest first."""
+    cursor = get_connection(db_name).execute(
+        'SELECT versao, definicao, criada_em, aplicada_em FROM regras ORDER BY versao')
+    return [(v, json.loads(d), c, a) for v, d, c, a in cursor]
+
+
+def load_rules_version(versao=None, aplicada=False, db_name=None):
+    """(versao, definicao) of `versao`, or of the newest one (the newest
+    applied one with aplicada=True); None if there is no such version."""
+    if versao is not None:
+        sql, params = 'SELECT versao, definicao FROM regras WHERE versao = ?', (versao,)
+    elif aplicada:
+        sql, params = 'SELECT versao, definicao FROM regras WHERE aplicada_em IS NOT NULL ORDER BY aplicada_em DESC, versao DESC LIMIT 1', ()
+    else:
+        sql, params = 'SELECT versao, definicao FROM regras ORDER BY versao DESC LIMIT 1', ()
+    row = get_connection(db_name).execute(sql, params).fetchone()
+    return (row[0], json.loads(row[1])) if row else None
+
+
+# --- Bulk Recompute ---
+# Derived columns are recomputed in SQL over a rowid range. The WHERE clause
+# skips rows whose stored values already match, so unchanged rows are never
+# rewritten and their index entries stay untouched.
+_APTO_USUARIO = "CASE WHEN idade >= :idade_minima AND renda <= :renda_maxima THEN 'Sim' ELSE 'Não' END"
+# The audit log records each recompute statement once, with the keys it
+# changed; the *_CHAVES variants replay it by key, since a restored copy
+# does not keep the rowids.
+_FAIXA = 'rowid BETWEEN :inicio AND :fim'
+_CHAVES = '{} IN (SELECT value FROM json_each(:chaves))'
+CONTAR_USUARIOS_SQL = f'''
+    SELECT COUNT(*), COALESCE(SUM(novo = 'Sim'), 0), json_group_array(nome) FROM (
+        SELECT nome, apto, {_APTO_USUARIO} AS novo FROM usuarios WHERE {_FAIXA}
+    ) WHERE apto IS NOT novo
+'''
+_RECALCULAR_USUARIOS = f'''
+    UPDATE usuarios SET
+        apto = {_APTO_USUARIO},
+        local_designado = CASE WHEN {_APTO_USUARIO} = 'Sim' THEN :lista_espera ELSE 'N/A' END,
+        prazo_comparecimento = 'N/A'
+    WHERE {{}} AND apto IS NOT {_APTO_USUARIO}
+'''
+RECALCULAR_USUARIOS_SQL = _RECALCULAR_USUARIOS.format(_FAIXA)
+RECALCULAR_USUARIOS_CHAVES_SQL = _RECALCULAR_USUARIOS.format(_CHAVES.format('nome'))
+_CAPACIDADE = 'andares * area * :fator_capacidade'
+_APTO_LOCAL = f"CASE WHEN {_CAPACIDADE} >= :capacidade_minima_local THEN 'Sim' ELSE 'Não' END"
+CONTAR_LOCAIS_SQL = f'''
+    SELECT COUNT(*), COALESCE(SUM(novo = 'Sim' AND apto IS NOT 'Sim'), 0),
+           COALESCE(SUM(novo = 'Não' AND apto IS 'Sim'), 0), json_group_array(nome_local) FROM (
+        SELECT nome_local, apto, capacidade_producao AS capacidade, {_CAPACIDADE} AS nova, {_APTO_LOCAL} AS novo
+        FROM locais WHERE {_FAIXA}
+    ) WHERE capacidade IS NOT nova OR apto IS NOT novo
+'''
+_RECALCULAR_LOCAIS = f'''
+    UPDATE locais SET capacidade_producao = {_CAPACIDADE}, apto = {_APTO_LOCAL}
+    WHERE {{}} AND (capacidade_producao IS NOT {_CAPACIDADE} OR apto IS NOT {_APTO_LOCAL})
+'''
+RECALCULAR_LOCAIS_SQL = _RECALCULAR_LOCAIS.format(_FAIXA)
+RECALCULAR_LOCAIS_CHAVES_SQL = _RECALCULAR_LOCAIS.format(_CHAVES.format('nome_local'))
+ENCOLHIDOS_SQL = f'''
+    SELECT nome_local FROM locais
+    WHERE {_FAIXA} AND apto = 'Sim' AND {_APTO_LOCAL} = 'Sim'
+      AND {_CAPACIDADE} < capacidade_producao
+'''
+LIBERAR_LOCAIS_INAPTOS_SQL = '''
+    UPDATE usuarios SET local_designado = :lista_espera, prazo_comparecimento = 'N/A'
+    WHERE apto = 'Sim' AND local_designado IN (SELECT nome_local FROM locais WHERE apto != 'Sim')
+'''
+
+
+def rowid_range(tabela, db_name=None):
+    return get_connection(db_name).execute(f'SELECT MIN(rowid), MAX(rowid) FROM {tabela}').fetchone()
+
+
+def recompute_usuarios_range(inicio, fim, definicao, lista_espera, db_name=None):
+    """Re-evaluate apto for rowids [inicio, fim]. Users who flip to Sim go to
+    the waiting list, those who flip to Não lose their assignment.
+    Returns (rows rewritten, of which now apto)."""
+    params = dict(definicao, lista_espera=lista_espera)
+    faixa = dict(params, inicio=inicio, fim=fim)
+    with unit_of_work(db_name) as conn:
+        alterados, para_sim, chaves = conn.execute(CONTAR_USUARIOS_SQL, faixa).fetchone()
+        if alterados:
+            with _registro_por_comando(conn, 'usuarios', 'recalculo', RECALCULAR_USUARIOS_CHAVES_SQL, params, chaves):
+                conn.execute(RECALCULAR_USUARIOS_SQL, faixa)
+    return alterados, para_sim
+
+
+def recompute_locais_range(inicio, fim, definicao, db_name=None):
+    """Re-evaluate capacidade_producao and apto for rowids [inicio, fim].
+    Returns (rows rewritten, flipped to Sim, flipped to Não, names of the
+    sites that stay apto with less capacity)."""
+    faixa = dict(definicao, inicio=inicio, fim=fim)
+    encolhidos = []
+    with unit_of_work(db_name) as conn:
+        alterados, para_sim, para_nao, chaves = conn.execute(CONTAR_LOCAIS_SQL, faixa).fetchone()
+        if alterados:
+            encolhidos = [nome for nome, in conn.execute(ENCOLHIDOS_SQL, faixa)]
+            with _registro_por_comando(conn, 'locais', 'recalculo', RECALCULAR_LOCAIS_CHAVES_SQL, definicao, chaves):
+                conn.execute(RECALCULAR_LOCAIS_SQL, faixa)
+    return alterados, para_sim, para_nao, encolhidos
+
+
+def release_unfit_locais(lista_espera, db_name=None):
+    """Move users assigned to a site that is no longer apto to the waiting
+    list; returns how many were moved."""
+    with unit_of_work(db_name) as conn:
+        return conn.execute(LIBERAR_LOCAIS_INAPTOS_SQL, {'lista_espera': lista_espera}).rowcount
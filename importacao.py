@@ -0,0 +1,252 @@
+"""Bulk import/export of usuarios and locais (CSV, or Parquet with pyarrow).
+
+    python importacao.py importar usuarios cadastros.csv [--rejeitados rej.csv] [--alocar]
+    python importacao.py exportar locais locais.parquet
+
+Files are processed in chunks, so memory use depends on --chunk, not on the
+size of the file. Derived columns (apto, capacidade_producao) are computed
+per chunk with NumPy, and each chunk is written with executemany in one
+transaction. New apto users go to the waiting list, like
+core.criar_usuarios_lote; users already in the database who stay apto keep
+their site and date. Sites re-imported with fewer places or a different apto
+have their users reassigned. --alocar hands out the waiting list at the end.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import database
+from alocacao import alocar_lista_espera, realocar_locais
+from recalculo import carregar_regras
+from regras import (LOCAL_LISTA_ESPERA, MENSAGEM_LOCAL, verificar_aptidao_usuario_vec, calcular_capacidade_producao_vec,
+                    verificar_aptidao_local_vec, sim_nao_vec)
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+
+CHUNK_SIZE = 50_000
+
+# Input columns and which of them must be numeric.
+ENTRADA = {
+    'usuarios': {
+        'chave': 'nome',
+        'colunas': ['nome', 'idade', 'endereco', 'pessoas_casa', 'renda', 'profissao'],
+        'inteiros': ['idade', 'pessoas_casa'],
+        'reais': ['renda'],
+    },
+    'locais': {
+        'chave': 'nome_local',
+        'colunas': ['nome_local', 'endereco', 'responsavel', 'contato', 'andares', 'area'],
+        'inteiros': ['andares'],
+        'reais': ['area'],
+    },
+}
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in ('.parquet', '.pq')
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise SystemExit("Parquet requer o pacote pyarrow (pip install pyarrow).")
+
+
+# --- Reading ---
+def ler_em_blocos(path, colunas, chunk_size=CHUNK_SIZE):
+    if _is_parquet(path):
+        _require_pyarrow()
+        arquivo = pq.ParquetFile(path)
+        for batch in arquivo.iter_batches(batch_size=chunk_size, columns=colunas):
+            yield batch.to_pandas()
+    else:
+        # Everything is read as text; numeric validation happens below.
+        yield from pd.read_csv(path, usecols=colunas, dtype=str, chunksize=chunk_size,
+                               keep_default_na=False)
+
+
+# --- Validation and Derived Columns ---
+def validar(df, tabela):
+    """Split a raw chunk into (valid rows, rejected rows with a 'motivo' column)."""
+    spec = ENTRADA[tabela]
+    bruto = df
+    df = df.copy()
+    motivo = pd.Series('', index=df.index, dtype=object)
+
+    chave = df[spec['chave']].fillna('').astype(str).str.strip()
+    df[spec['chave']] = chave
+    motivo[chave == ''] = f"{spec['chave']} vazio"
+
+    for col in spec['inteiros'] + spec['reais']:
+        numeros = pd.to_numeric(df[col], errors='coerce')
+        valores = numeros.astype('float64')
+        # Same rules as core._valor: finite, not negative, and integers
+        # whole and within int64.
+        invalido = ~np.isfinite(valores) | (valores < 0)
+        if col in spec['inteiros']:
+            invalido |= (valores != np.floor(valores)) | (valores >= 2.0 ** 63)
+        motivo[invalido & (motivo == '')] = f"{col} inválido"
+        df[col] = numeros
+
+    ok = motivo == ''
+    rejeitados = bruto.loc[~ok].copy()
+    rejeitados['motivo'] = motivo[~ok]
+    validos = df.loc[ok]
+    for col in spec['inteiros']:
+        validos = validos.astype({col: 'int64'})
+    for col in spec['reais']:
+        validos = validos.astype({col: 'float64'})
+    # Same semantics as the upsert: the last occurrence of a key wins.
+    validos = validos.drop_duplicates(subset=spec['chave'], keep='last')
+    return validos, rejeitados
+
+
+def derivar_usuarios(df):
+    apto = verificar_aptidao_usuario_vec(df['idade'], df['renda'])
+    df = df.assign(
+        apto=sim_nao_vec(apto),
+        local_designado=np.where(apto, LOCAL_LISTA_ESPERA, "N/A"),
+        prazo_comparecimento="N/A",
+    )
+    return df[list(database.USUARIO_COLUMNS)]
+
+
+def derivar_locais(df):
+    capacidade = calcular_capacidade_producao_vec(df['andares'], df['area'])
+    df = df.assign(
+        capacidade_producao=capacidade,
+        apto=sim_nao_vec(verificar_aptidao_local_vec(capacidade)),
+        mensagem=MENSAGEM_LOCAL,
+    )
+    return df[list(database.LOCAL_COLUMNS)]
+
+
+# --- Import ---
+def _locais_alterados(conn, linhas):
+    """Names in `linhas` whose site already exists and, after the upsert,
+    holds fewer places or changes apto; their users must be reassigned."""
+    nomes = json.dumps(linhas['nome_local'].tolist())
+    antes = pd.DataFrame(conn.execute("""
+        SELECT nome_local, capacidade_producao, apto FROM locais
+        WHERE nome_local IN (SELECT value FROM json_each(?))
+    """, (nomes,)).fetchall(), columns=['nome_local', 'capacidade_anterior', 'apto_anterior'])
+    depois = antes.merge(linhas[['nome_local', 'capacidade_producao', 'apto']], on='nome_local')
+    mudou = ((depois['capacidade_producao'] < depois['capacidade_anterior'])
+             | (depois['apto'] != depois['apto_anterior']))
+    return depois.loc[mudou, 'nome_local'].tolist()
+
+
+def importar(tabela, path, chunk_size=CHUNK_SIZE, rejeitados_path=None, alocar=False, db_name=None):
+    spec = ENTRADA[tabela]
+    sql = database.IMPORT_USUARIO_SQL if tabela == 'usuarios' else database.UPSERT_LOCAL_SQL
+    derivar = derivar_usuarios if tabela == 'usuarios' else derivar_locais
+    database.create_tables(db_name)
+    carregar_regras(db_name)
+
+    inicio = time.perf_counter()
+    total = importados = rejeitados_total = 0
+    primeiro_rejeitado = True
+    alterados = []
+    for bloco in ler_em_blocos(path, spec['colunas'], chunk_size):
+        total += len(bloco)
+        validos, rejeitados = validar(bloco, tabela)
+        linhas = derivar(validos)
+        with database.unit_of_work(db_name) as conn:
+            if tabela == 'locais':
+                alterados += _locais_alterados(conn, linhas)
+            conn.executemany(sql, linhas.itertuples(index=False, name=None))
+        importados += len(linhas)
+        rejeitados_total += len(rejeitados)
+        if rejeitados_path and len(rejeitados):
+            rejeitados.to_csv(rejeitados_path, mode='w' if primeiro_rejeitado else 'a',
+                              header=primeiro_rejeitado, index=False)
+            primeiro_rejeitado = False
+    database.optimize(db_name)
+
+    resultado = {'lidas': total, 'importadas': importados, 'rejeitadas': rejeitados_total}
+    if alterados:
+        # Sites that shrank or changed apto, like core.atualizar_local.
+        resultado['realocados'] = realocar_locais(alterados, db_name=db_name)
+    if alocar:
+        resultado['alocados'] = alocar_lista_espera(db_name=db_name)
+    resultado['segundos'] = time.perf_counter() - inicio
+    return resultado
+
+
+# --- Export ---
+def exportar(tabela, path, chunk_size=CHUNK_SIZE, db_name=None):
+    colunas = list(database.USUARIO_COLUMNS if tabela == 'usuarios' else database.LOCAL_COLUMNS)
+    cursor = database.get_connection(db_name).execute(f"SELECT {', '.join(colunas)} FROM {tabela}")
+
+    inicio = time.perf_counter()
+    total = 0
+    if _is_parquet(path):
+        _require_pyarrow()
+        writer = None
+        try:
+            while rows := cursor.fetchmany(chunk_size):
+                table = pyarrow.Table.from_pandas(pd.DataFrame(rows, columns=colunas),
+                                                  preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                total += len(rows)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(colunas)
+            while rows := cursor.fetchmany(chunk_size):
+                writer.writerows(rows)
+                total += len(rows)
+
+    return {'exportadas': total, 'segundos': time.perf_counter() - inicio}
+
+
+def _relatorio(resultado):
+    segundos = resultado['segundos'] or 1e-9
+    linhas = resultado.get('lidas', resultado.get('exportadas'))
+    partes = [f"{k}={v}" for k, v in resultado.items() if k != 'segundos']
+    print(f"{' '.join(partes)} tempo={segundos:.2f}s linhas/s={linhas / segundos:.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa/exporta usuarios e locais em lote.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    imp = sub.add_parser('importar')
+    imp.add_argument('tabela', choices=ENTRADA)
+    imp.add_argument('arquivo')
+    imp.add_argument('--rejeitados', help="CSV onde gravar as linhas rejeitadas e o motivo")
+    imp.add_argument('--alocar', action='store_true', help="aloca a lista de espera ao final")
+
+    exp = sub.add_parser('exportar')
+    exp.add_argument('tabela', choices=ENTRADA)
+    exp.add_argument('arquivo')
+
+    for p in (imp, exp):
+        p.add_argument('--chunk', type=int, default=CHUNK_SIZE)
+        p.add_argument('--db', default=database.DB_NAME)
+
+    args = parser.parse_args(argv)
+    if args.comando == 'importar':
+        resultado = importar(args.tabela, args.arquivo, args.chunk, args.rejeitados, args.alocar, args.db)
+    else:
+        resultado = exportar(args.tabela, args.arquivo, args.chunk, args.db)
+    _relatorio(resultado)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
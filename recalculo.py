@@ -0,0 +1,137 @@
+"""Versioned business rules and bulk re-evaluation of stored rows.
+
+    python recalculo.py definir --renda-maxima 2500 [--idade-minima 18] ...
+    python recalculo.py versoes
+    python recalculo.py recalcular [--versao N] [--chunk 200000] [--alocar]
+
+`definir` stores a new version (the unspecified thresholds are copied from
+the newest one); it changes nothing until `recalcular` applies it. That
+rewrites apto/capacidade_producao for the rows whose result actually
+changes, one rowid range per transaction, and marks the version as
+applied. The front ends, the service and the importer load the applied
+version at startup through carregar_regras(), so new and edited records
+follow the same thresholds as the recomputed ones.
+
+Users who become apto are put on the waiting list, users who stop being
+apto (or whose site stops being apto) lose their assignment. Sites that
+lose capacity but stay apto have their users reassigned with
+alocacao.realocar_locais, and --alocar hands out the waiting list.
+"""
+import argparse
+import sys
+import time
+
+import database
+import regras
+from regras import LOCAL_LISTA_ESPERA
+
+CHUNK_SIZE = 200_000
+
+
+def carregar_regras(db_name=None):
+    """Apply the newest applied rule version, if any; returns its number."""
+    versao = database.load_rules_version(aplicada=True, db_name=db_name)
+    if versao is None:
+        return None
+    regras.aplicar_definicao(versao[1])
+    return versao[0]
+
+
+def definir(alteracoes, db_name=None):
+    base = database.load_rules_version(db_name=db_name)
+    definicao = dict(base[1]) if base else regras.definicao_atual()
+    definicao.update(alteracoes)
+    definicao = regras.validar_definicao(definicao)
+    return database.save_rules_version(definicao, db_name), definicao
+
+
+def _faixas(tabela, chunk_size, db_name):
+    inicio, fim = database.rowid_range(tabela, db_name)
+    if inicio is None:
+        return
+    for lo in range(inicio, fim + 1, chunk_size):
+        yield lo, min(fim, lo + chunk_size - 1)
+
+
+def recalcular(versao=None, chunk_size=CHUNK_SIZE, alocar=False, progresso=None, db_name=None):
+    """Apply a stored rule version (the newest by default) to every row."""
+    progresso = progresso or (lambda fracao, mensagem='': None)
+    encontrada = database.load_rules_version(versao, db_name=db_name)
+    if encontrada is None:
+        raise ValueError("Nenhuma versão de regras definida." if versao is None
+                         else f"Versão de regras inexistente: {versao}")
+    versao, definicao = encontrada
+    definicao = regras.validar_definicao(definicao)
+    inicio = time.perf_counter()
+    resultado = {'versao': versao}
+
+    progresso(0.0, "Recalculando locais...")
+    alterados = para_sim = para_nao = 0
+    encolhidos = []
+    for lo, hi in _faixas('locais', chunk_size, db_name):
+        a, s, n, e = database.recompute_locais_range(lo, hi, definicao, db_name)
+        alterados, para_sim, para_nao = alterados + a, para_sim + s, para_nao + n
+        encolhidos += e
+    resultado.update(locais_alterados=alterados, locais_para_apto=para_sim, locais_para_inapto=para_nao)
+    resultado['usuarios_liberados'] = (database.release_unfit_locais(LOCAL_LISTA_ESPERA, db_name)
+                                       if para_nao else 0)
+
+    progresso(0.2, "Recalculando usuários...")
+    alterados = para_sim = 0
+    faixas = list(_faixas('usuarios', chunk_size, db_name))
+    for i, (lo, hi) in enumerate(faixas):
+        a, s = database.recompute_usuarios_range(lo, hi, definicao, LOCAL_LISTA_ESPERA, db_name)
+        alterados, para_sim = alterados + a, para_sim + s
+        progresso(0.2 + 0.6 * (i + 1) / len(faixas))
+    resultado.update(usuarios_para_apto=para_sim, usuarios_para_inapto=alterados - para_sim)
+
+    database.mark_rules_applied(versao, db_name)
+    regras.aplicar_definicao(definicao)
+    if alocar or encolhidos:
+        from alocacao import realocar_locais
+        progresso(0.8, "Realocando...")
+        # Also hands out the waiting list, which gets whatever the shrunken
+        # sites still have room for.
+        resultado['realocados'] = realocar_locais(encolhidos, db_name=db_name)
+    resultado['segundos'] = time.perf_counter() - inicio
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Versões das regras de negócio e recálculo em lote.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    dfn = sub.add_parser('definir', help="grava uma nova versão das regras")
+    for chave in regras.definicao_atual():
+        dfn.add_argument('--' + chave.replace('_', '-'), dest=chave, type=float)
+
+    sub.add_parser('versoes', help="lista as versões gravadas")
+
+    rec = sub.add_parser('recalcular', help="aplica uma versão a todas as linhas")
+    rec.add_argument('--versao', type=int)
+    rec.add_argument('--chunk', type=int, default=CHUNK_SIZE)
+    rec.add_argument('--alocar', action='store_true', help="aloca a lista de espera ao final")
+
+    for p in (dfn, sub.choices['versoes'], rec):
+        p.add_argument('--db', default=database.DB_NAME)
+
+    args = parser.parse_args(argv)
+    database.create_tables(args.db)
+    if args.comando == 'definir':
+        alteracoes = {chave: int(v) if v.is_integer() else v
+                      for chave in regras.definicao_atual()
+                      if (v := getattr(args, chave)) is not None}
+        versao, definicao = definir(alteracoes, args.db)
+        print(f"versão {versao}: {definicao}")
+    elif args.comando == 'versoes':
+        for versao, definicao, criada_em, aplicada_em in database.load_rules_versions(args.db):
+            print(f"{versao:4d}  criada {criada_em}  aplicada {aplicada_em or '-':19}  {definicao}")
+    else:
+        resultado = recalcular(args.versao, args.chunk, args.alocar, db_name=args.db)
+        print(' '.join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                       for k, v in resultado.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import datetime
+
+import numpy as np
+
+# --- Business Rules ---
+IDADE_MINIMA = 18
+RENDA_MAXIMA = 2000
+CAPACIDADE_MINIMA_LOCAL = 1000
+# Production per m² per floor.
+FATOR_CAPACIDADE = 2
+PRAZO_CADASTRO_DIAS = 15
+PRAZO_ATUALIZACAO_DIAS = 30
+MENSAGEM_LOCAL = "O responsável será contatado para mais informações."
+
+
+def verificar_aptidao_usuario(idade, renda):
+    return idade >= IDADE_MINIMA and renda <= RENDA_MAXIMA
+
+
+def calcular_capacidade_producao(andares, area):
+    return andares * area * FATOR_CAPACIDADE
+
+
+def verificar_aptidao_local(capacidade):
+    return capacidade >= CAPACIDADE_MINIMA_LOCAL
+
+
+def prazo_comparecimento(dias, hoje=None):
+    return ((hoje or datetime.date.today()) + datetime.timedelta(days=dias)).isoformat()
+
+
+# --- Versioned Definitions ---
+# The thresholds above are the defaults. Stored versions (recalculo.py)
+# replace them at startup through aplicar_definicao().
+def definicao_atual():
+    return {
+        'idade_minima': IDADE_MINIMA,
+        'renda_maxima': RENDA_MAXIMA,
+        'capacidade_minima_local': CAPACIDADE_MINIMA_LOCAL,
+        'fator_capacidade': FATOR_CAPACIDADE,
+    }
+
+
+def validar_definicao(definicao):
+    """Return a complete definition: missing keys keep their current value."""
+    completa = definicao_atual()
+    desconhecidas = set(definicao) - set(completa)
+    if desconhecidas:
+        raise ValueError(f"Regras desconhecidas: {', '.join(sorted(desconhecidas))}")
+    for chave, valor in definicao.items():
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or valor < 0:
+            raise ValueError(f"Valor inválido para {chave}: {valor!r}")
+        completa[chave] = valor
+    return completa
+
+
+def aplicar_definicao(definicao):
+    global IDADE_MINIMA, RENDA_MAXIMA, CAPACIDADE_MINIMA_LOCAL, FATOR_CAPACIDADE
+    definicao = validar_definicao(definicao)
+    IDADE_MINIMA = definicao['idade_minima']
+    RENDA_MAXIMA = definicao['renda_maxima']
+    CAPACIDADE_MINIMA_LOCAL = definicao['capacidade_minima_local']
+    FATOR_CAPACIDADE = definicao['fator_capacidade']
+
+
+# --- Vectorized Versions (NumPy arrays / pandas Series) ---
+def verificar_aptidao_usuario_vec(idade, renda):
+    return (np.asarray(idade) >= IDADE_MINIMA) & (np.asarray(renda) <= RENDA_MAXIMA)
+
+
+def calcular_capacidade_producao_vec(andares, area):
+    return np.asarray(andares) * np.asarray(area) * FATOR_CAPACIDADE
+
+
+def verificar_aptidao_local_vec(capacidade):
+    return np.asarray(capacidade) >= CAPACIDADE_MINIMA_LOCAL
+
+
+def sim_nao_vec(mask):
+    return np.where(mask, "Sim", "Não")
+
+
+# --- Allocation ---
+# A site serves capacidade_producao / PRODUCAO_POR_PESSOA people, and each
+# applicant takes pessoas_casa of those places.
+PRODUCAO_POR_PESSOA = 10
+# Arrivals a site can receive per day, per floor.
+CHEGADAS_POR_DIA_POR_ANDAR = 5
+LOCAL_LISTA_ESPERA = "Lista de espera"
+
+
+def vagas_local(capacidade):
+    return int(capacidade // PRODUCAO_POR_PESSOA)
+
+
+def chegadas_por_dia(andares):
+    return max(1, int(andares) * CHEGADAS_POR_DIA_POR_ANDAR)
+
+
+def vagas_local_vec(capacidade):
+    return (np.asarray(capacidade, dtype=float) // PRODUCAO_POR_PESSOA).astype(np.int64)
+
+
+def chegadas_por_dia_vec(andares):
+    return np.maximum(1, np.asarray(andares, dtype=np.int64) * CHEGADAS_POR_DIA_POR_ANDAR)
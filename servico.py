@@ -0,0 +1,262 @@
+"""HTTP/JSON service over core.py, built on asyncio streams (stdlib only).
+
+    python servico.py [--host 127.0.0.1] [--porta 8080] [--pool 8] [--db vertical_farm.db]
+
+Routes, for both /usuarios and /locais:
+
+    GET    /usuarios?limit=&order_by=&desc=1&after=<json>&busca=   one keyset page
+    POST   /usuarios                                              create one
+    POST   /usuarios/lote        [{...}, ...]                     create many
+    DELETE /usuarios/lote        ["nome", ...]                    remove many
+    GET    /usuarios/<nome>
+    PATCH  /usuarios/<nome>      {"campo": valor, ...}            (PUT works too)
+    DELETE /usuarios/<nome>
+
+plus POST /alocacao {"custo": "regiao"} to rerun the global allocation and
+GET /saude. Pages carry a `proximo` cursor to pass back as `after`.
+
+The event loop only parses and writes HTTP. Every core call runs on a
+fixed ThreadPoolExecutor whose threads each hold one persistent SQLite
+connection (database.get_connection is thread-local), so the pool size is
+the bound on open connections and concurrent queries; requests beyond it
+wait in the executor queue instead of opening more.
+"""
+import argparse
+import asyncio
+import json
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import core
+import database
+from alocacao import alocar_todos, CUSTOS
+from recalculo import carregar_regras
+
+POOL_CONEXOES = 8
+MAX_CORPO = 16 * 1024 * 1024
+MAX_LOTE = 10_000
+
+STATUS = {200: 'OK', 201: 'Created', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+          405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+          500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class ErroHTTP(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+RECURSOS = {
+    'usuarios': {
+        'obter': core.obter_usuario, 'criar': core.criar_usuario, 'atualizar': core.atualizar_usuario,
+        'remover': core.remover_usuario, 'criar_lote': core.criar_usuarios_lote,
+        'remover_lote': core.remover_usuarios_lote, 'listar': core.listar_usuarios,
+    },
+    'locais': {
+        'obter': core.obter_local, 'criar': core.criar_local, 'atualizar': core.atualizar_local,
+        'remover': core.remover_local, 'criar_lote': core.criar_locais_lote,
+        'remover_lote': core.remover_locais_lote, 'listar': core.listar_locais,
+    },
+}
+
+
+def _parametros_pagina(query):
+    q = {k: v[-1] for k, v in parse_qs(query).items()}
+    params = {}
+    try:
+        if 'limit' in q:
+            params['limit'] = int(q['limit'])
+        if q.get('after'):
+            after = json.loads(q['after'])
+            if not isinstance(after, list) or len(after) != 2:
+                raise ValueError
+            params['after'] = after
+    except ValueError:
+        raise ErroHTTP(400, "Parâmetros de paginação inválidos.") from None
+    if 'order_by' in q:
+        params['order_by'] = q['order_by']
+    if q.get('desc', '') in ('1', 'true', 'sim'):
+        params['descending'] = True
+    if q.get('busca'):
+        params['busca'] = q['busca']
+    return params
+
+
+def _lote(corpo):
+    if not isinstance(corpo, list):
+        raise ErroHTTP(400, "O corpo deve ser uma lista.")
+    if len(corpo) > MAX_LOTE:
+        raise ErroHTTP(413, f"Lote acima de {MAX_LOTE} itens.")
+    return corpo
+
+
+def _objeto(corpo):
+    if not isinstance(corpo, dict):
+        raise ErroHTTP(400, "O corpo deve ser um objeto JSON.")
+    return corpo
+
+
+class Servico:
+    def __init__(self, db_name=None, pool=POOL_CONEXOES):
+        self.db_name = db_name
+        self.pool = ThreadPoolExecutor(max_workers=pool, thread_name_prefix='conexao')
+
+    async def _executar(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, partial(fn, *args, db_name=self.db_name, **kwargs))
+
+    # --- Routing ---
+    async def rotear(self, metodo, caminho, query, corpo):
+        partes = [unquote(p) for p in caminho.strip('/').split('/') if p]
+        if partes == ['saude']:
+            return 200, {'ok': True}
+        if partes == ['alocacao']:
+            if metodo != 'POST':
+                raise ErroHTTP(405, "Use POST.")
+            custo = _objeto(corpo or {}).get('custo', 'regiao')
+            if custo not in CUSTOS:
+                raise ErroHTTP(400, f"Custo desconhecido: {custo}")
+            return 200, await self._executar(alocar_todos, custo=CUSTOS[custo]())
+        if not partes or partes[0] not in RECURSOS or len(partes) > 2:
+            raise ErroHTTP(404, "Rota não encontrada.")
+
+        recurso = RECURSOS[partes[0]]
+        if len(partes) == 1:
+            if metodo == 'GET':
+                return 200, await self._executar(recurso['listar'], **_parametros_pagina(query))
+            if metodo == 'POST':
+                return 201, await self._executar(recurso['criar'], _objeto(corpo))
+        elif partes[1] == 'lote':
+            if metodo == 'POST':
+                return 200, {'resultados': await self._executar(recurso['criar_lote'], _lote(corpo))}
+            if metodo == 'DELETE':
+                return 200, {'removidos': await self._executar(recurso['remover_lote'], _lote(corpo))}
+        else:
+            chave = partes[1]
+            if metodo == 'GET':
+                return 200, await self._executar(recurso['obter'], chave)
+            if metodo in ('PATCH', 'PUT'):
+                return 200, await self._executar(recurso['atualizar'], chave, _objeto(corpo))
+            if metodo == 'DELETE':
+                await self._executar(recurso['remover'], chave)
+                return 204, None
+        raise ErroHTTP(405, "Método não permitido.")
+
+    async def responder(self, metodo, alvo, corpo):
+        url = urlsplit(alvo)
+        try:
+            if corpo:
+                try:
+                    corpo = json.loads(corpo)
+                except ValueError:
+                    raise ErroHTTP(400, "JSON inválido.") from None
+            else:
+                corpo = None
+            return await self.rotear(metodo, url.path, url.query, corpo)
+        except ErroHTTP as erro:
+            return erro.status, {'erro': str(erro)}
+        except core.RegistroNaoEncontrado as erro:
+            return 404, {'erro': f"Registro não encontrado: {erro.args[0]}"}
+        except core.RegistroDuplicado as erro:
+            return 409, {'erro': str(erro)}
+        except ValueError as erro:
+            return 400, {'erro': str(erro)}
+        except sqlite3.OperationalError as erro:
+            # Typically "database is locked" after busy_timeout.
+            return 503, {'erro': str(erro)}
+        except Exception as erro:
+            return 500, {'erro': f"{type(erro).__name__}: {erro}"}
+
+    # --- HTTP/1.1 ---
+    async def conexao(self, reader, writer):
+        try:
+            while True:
+                linha = await reader.readline()
+                if not linha:
+                    break
+                try:
+                    metodo, alvo, versao = linha.decode('latin-1').split()
+                except ValueError:
+                    await self._enviar(writer, 400, {'erro': "Requisição inválida."}, fechar=True)
+                    break
+                cabecalhos = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b'\r\n', b'\n', b''):
+                        break
+                    nome, _, valor = h.decode('latin-1').partition(':')
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+                try:
+                    tamanho = int(cabecalhos.get('content-length', 0) or 0)
+                    if tamanho < 0:
+                        raise ValueError
+                except ValueError:
+                    await self._enviar(writer, 400, {'erro': "Content-Length inválido."}, fechar=True)
+                    break
+                if tamanho > MAX_CORPO:
+                    await self._enviar(writer, 413, {'erro': "Corpo grande demais."}, fechar=True)
+                    break
+                corpo = await reader.readexactly(tamanho) if tamanho else b''
+                fechar = (cabecalhos.get('connection', '').lower() == 'close'
+                          or (versao == 'HTTP/1.0' and cabecalhos.get('connection', '').lower() != 'keep-alive'))
+                status, resposta = await self.responder(metodo.upper(), alvo, corpo)
+                await self._enviar(writer, status, resposta, fechar)
+                if fechar:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _enviar(writer, status, resposta, fechar=False):
+        corpo = b'' if resposta is None else json.dumps(resposta, ensure_ascii=False).encode('utf-8')
+        cabecalho = (f"HTTP/1.1 {status} {STATUS.get(status, '')}\r\n"
+                     f"Content-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(corpo)}\r\n"
+                     f"Connection: {'close' if fechar else 'keep-alive'}\r\n\r\n")
+        writer.write(cabecalho.encode('latin-1') + corpo)
+        await writer.drain()
+
+    async def iniciar(self, host='127.0.0.1', porta=8080):
+        await self._executar(database.create_tables)
+        await self._executar(carregar_regras)
+        database.definir_operador('servico')
+        return await asyncio.start_server(self.conexao, host, porta)
+
+    def encerrar(self):
+        self.pool.shutdown(wait=True)
+
+
+async def _servir(args):
+    servico = Servico(args.db, args.pool)
+    servidor = await servico.iniciar(args.host, args.porta)
+    print(f"Servindo em http://{args.host}:{args.porta} ({args.pool} conexões)")
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        servico.encerrar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço HTTP/JSON de usuários e locais.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--pool', type=int, default=POOL_CONEXOES,
+                        help="conexões SQLite (threads de trabalho)")
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_servir(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
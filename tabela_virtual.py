@@ -0,0 +1,138 @@
+from tkinter import messagebox, ttk
+
+import database
+from consultas import filtro_da_busca
+
+PAGE_SIZE = 200
+# Fetch the next page once the visible window passes this fraction of the
+# rows already loaded.
+PREFETCH_AT = 0.8
+
+
+class TabelaVirtual(ttk.Frame):
+    """Treeview that loads rows from SQLite page by page as the user scrolls.
+
+    Only the rows scrolled past so far are ever inserted, so opening the
+    window costs one page regardless of the table size. Clicking a column
+    header re-sorts on the database side (click again to reverse), and the
+    search box filters with the syntax of consultas.interpretar_busca.
+
+    With an `executor` (tarefas.ExecutorTarefas) pages are fetched in the
+    background and inserted when they arrive. `ao_vazia` is called if the
+    unfiltered table turns out to be empty.
+    """
+
+    def __init__(self, master, tabela, page_size=PAGE_SIZE, busca=True, executor=None,
+                 ao_vazia=None, db_name=None):
+        super().__init__(master)
+        self.tabela = tabela
+        self.colunas = database.TABLE_COLUMNS[tabela]
+        self.page_size = page_size
+        self.db_name = db_name
+        self.executor = executor
+        self.ao_vazia = ao_vazia
+        self.order_by = self.colunas[0]
+        self.descending = False
+        self._cursor = None
+        self._esgotada = False
+        self._agendada = False
+        self._carregando = False
+        # Bumped on every reload so pages of a previous sort/filter are dropped.
+        self._geracao = 0
+        self.filtro = None
+
+        if busca:
+            barra = ttk.Frame(self)
+            barra.pack(side='top', fill='x')
+            self.busca_entry = ttk.Entry(barra)
+            self.busca_entry.pack(side='left', fill='x', expand=True, padx=2, pady=2)
+            self.busca_entry.bind('<Return>', lambda event: self.buscar())
+            ttk.Button(barra, text="Buscar", command=self.buscar).pack(side='right', padx=2)
+
+        self.tree = ttk.Treeview(self, columns=self.colunas, show='headings')
+        scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.tree.yview)
+        self._scrollbar = scrollbar
+        self.tree.configure(yscrollcommand=self._on_scroll)
+        self.tree.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+
+        for col in self.colunas:
+            self.tree.heading(col, text=col, command=lambda c=col: self.ordenar(c))
+            self.tree.column(col, width=100)
+
+        self.recarregar()
+
+    @property
+    def vazia(self):
+        return not self.tree.get_children()
+
+    def recarregar(self):
+        self.tree.delete(*self.tree.get_children())
+        self._cursor = None
+        self._esgotada = False
+        self._carregando = False
+        self._geracao += 1
+        self.carregar_pagina()
+
+    def buscar(self):
+        self.filtro = filtro_da_busca(self.tabela, self.busca_entry.get())
+        self.recarregar()
+
+    def ordenar(self, coluna):
+        if coluna == self.order_by:
+            self.descending = not self.descending
+        else:
+            self.order_by, self.descending = coluna, False
+        for col in self.colunas:
+            seta = (' ▼' if self.descending else ' ▲') if col == self.order_by else ''
+            self.tree.heading(col, text=col + seta)
+        self.recarregar()
+
+    def carregar_pagina(self):
+        self._agendada = False
+        if self._esgotada or self._carregando:
+            return
+        self._carregando = True
+        geracao = self._geracao
+        args = (self.tabela, self.order_by, self.descending, self._cursor, self.page_size)
+        kwargs = {'filtro': self.filtro, 'db_name': self.db_name}
+        if self.executor is None:
+            self._inserir(database.fetch_page(*args, **kwargs), geracao)
+        else:
+            self.executor.submeter(database.fetch_page, *args, **kwargs,
+                                   ao_concluir=lambda rows: self._inserir(rows, geracao),
+                                   ao_falhar=lambda erro: self._falhou(erro, geracao))
+
+    def _inserir(self, rows, geracao):
+        if geracao != self._geracao or not self.winfo_exists():
+            return
+        self._carregando = False
+        if len(rows) < self.page_size:
+            self._esgotada = True
+        if not rows:
+            if self._cursor is None and self.filtro is None and self.ao_vazia is not None:
+                self.ao_vazia()
+            return
+        idx = self.colunas.index(self.order_by)
+        for row in rows:
+            # The primary key doubles as the item id. A row edited while
+            # scrolling can sort past the cursor and come back; keep the
+            # copy already shown.
+            if not self.tree.exists(row[0]):
+                self.tree.insert("", "end", iid=row[0], values=row)
+        last = rows[-1]
+        self._cursor = (last[idx], last[0])
+
+    def _falhou(self, erro, geracao):
+        if geracao != self._geracao or not self.winfo_exists():
+            return
+        # Let the next scroll (or a new search) try again.
+        self._carregando = False
+        messagebox.showerror("Erro", f"Não foi possível carregar os registros: {erro}", parent=self)
+
+    def _on_scroll(self, first, last):
+        self._scrollbar.set(first, last)
+        if not self._esgotada and not self._agendada and float(last) >= PREFETCH_AT:
+            # Defer so the Treeview finishes its own redraw first.
+            self._agendada = True
+            self.after_idle(self.carregar_pagina)
@@ -0,0 +1,172 @@
+import queue
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from tkinter import Toplevel, Label, Button, ttk
+
+INTERVALO_MS = 30
+# Callbacks run per poll, so a burst of results can't stall the mainloop.
+MAX_POR_CICLO = 50
+
+
+class TarefaCancelada(Exception):
+    pass
+
+
+class Tarefa:
+    """Handle for a submitted job: cooperative cancellation and progress.
+
+    Thread jobs submitted with com_tarefa=True receive this object as their
+    first argument. They call reportar() to publish progress, which also
+    raises TarefaCancelada once cancelar() was called.
+    """
+
+    def __init__(self, executor, ao_progresso):
+        self._executor = executor
+        self._ao_progresso = ao_progresso
+        self._cancelada = threading.Event()
+        self.future = None
+
+    @property
+    def cancelada(self):
+        return self._cancelada.is_set()
+
+    def cancelar(self):
+        self._cancelada.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def reportar(self, fracao, mensagem=''):
+        if self.cancelada:
+            raise TarefaCancelada()
+        if self._ao_progresso is not None:
+            self._executor._publicar(self._ao_progresso, fracao, mensagem)
+
+
+class ExecutorTarefas:
+    """Runs blocking work off the Tk thread and hands results back to it.
+
+    Workers never touch widgets: completion, error and progress callbacks
+    are queued and executed by a root.after() poll on the UI thread. Any
+    object with after(ms, fn) works as `root`, which is what the headless
+    harness in benchmarks/bench_tarefas.py relies on.
+    """
+
+    def __init__(self, root, max_workers=4, processos=0, intervalo_ms=INTERVALO_MS):
+        self.root = root
+        self.intervalo_ms = intervalo_ms
+        self._threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tarefa')
+        self._processos = ProcessPoolExecutor(max_workers=processos) if processos else None
+        self._fila = queue.SimpleQueue()
+        self._ativo = True
+        self.root.after(self.intervalo_ms, self._drenar)
+
+    def submeter(self, fn, *args, ao_concluir=None, ao_falhar=None, ao_progresso=None,
+                 com_tarefa=False, processo=False, **kwargs):
+        tarefa = Tarefa(self, ao_progresso)
+        if processo:
+            if self._processos is None:
+                raise ValueError("ExecutorTarefas criado sem pool de processos.")
+            if com_tarefa:
+                raise ValueError("Tarefas em processo não recebem o objeto Tarefa.")
+            future = self._processos.submit(fn, *args, **kwargs)
+        else:
+            if com_tarefa:
+                args = (tarefa,) + args
+            future = self._threads.submit(fn, *args, **kwargs)
+        tarefa.future = future
+
+        def concluido(f):
+            if f.cancelled():
+                return
+            erro = f.exception()
+            if erro is None:
+                if ao_concluir is not None:
+                    self._publicar(ao_concluir, f.result())
+            elif isinstance(erro, TarefaCancelada):
+                return
+            elif ao_falhar is not None:
+                self._publicar(ao_falhar, erro)
+        future.add_done_callback(concluido)
+        return tarefa
+
+    def _publicar(self, callback, *args):
+        self._fila.put((callback, args))
+
+    def _drenar(self):
+        try:
+            for _ in range(MAX_POR_CICLO):
+                try:
+                    callback, args = self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    callback(*args)
+                except Exception:
+                    # One failing callback must not stop the ones after it.
+                    self._relatar(*sys.exc_info())
+        finally:
+            # Always reschedule, or the poll (and every later callback) stops for good.
+            if self._ativo:
+                self.root.after(self.intervalo_ms, self._drenar)
+
+    def _relatar(self, tipo, erro, tb):
+        relatar = getattr(self.root, 'report_callback_exception', None)
+        if relatar is not None:
+            relatar(tipo, erro, tb)
+        else:
+            traceback.print_exception(tipo, erro, tb)
+
+    def encerrar(self):
+        self._ativo = False
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processos is not None:
+            self._processos.shutdown(wait=False, cancel_futures=True)
+
+
+# --- Progress Window ---
+class JanelaProgresso(Toplevel):
+    """Modal-ish progress bar with a Cancel button for a long Tarefa."""
+
+    def __init__(self, master, titulo):
+        super().__init__(master)
+        self.title(titulo)
+        self.geometry("320x120")
+        self.tarefa = None
+        self.mensagem = Label(self, text="Processando...")
+        self.mensagem.pack(pady=5)
+        self.barra = ttk.Progressbar(self, length=260, mode='determinate', maximum=1.0)
+        self.barra.pack(pady=5)
+        Button(self, text="Cancelar", command=self.cancelar).pack(pady=5)
+        self.protocol("WM_DELETE_WINDOW", self.cancelar)
+
+    def atualizar(self, fracao, mensagem=''):
+        if self.winfo_exists():
+            self.barra['value'] = fracao
+            if mensagem:
+                self.mensagem['text'] = mensagem
+
+    def cancelar(self):
+        if self.tarefa is not None:
+            self.tarefa.cancelar()
+        self.destroy()
+
+
+def executar_com_progresso(executor, master, titulo, fn, *args, ao_concluir=None, ao_falhar=None,
+                           **kwargs):
+    """Run fn(tarefa, *args) in the background behind a JanelaProgresso."""
+    janela = JanelaProgresso(master, titulo)
+
+    def fechar_e(callback):
+        def wrapper(valor):
+            if janela.winfo_exists():
+                janela.destroy()
+            if callback is not None:
+                callback(valor)
+        return wrapper
+
+    janela.tarefa = executor.submeter(fn, *args, com_tarefa=True, ao_progresso=janela.atualizar,
+                                      ao_concluir=fechar_e(ao_concluir), ao_falhar=fechar_e(ao_falhar),
+                                      **kwargs)
+    return janela.tarefa